@@ -0,0 +1,84 @@
+import io
+import time
+from typing import List
+from PIL import Image, features
+
+# encodes the frames of an animated plot. every frame is mapped onto one palette made from the
+# whole animation, so unchanged pixels stay identical between frames and the encoders only write
+# the region that changed (Pillow crops each gif and apng frame to its difference from the last
+# one, and merges frames that don't change at all into the one before)
+
+formats = {"gif": "GIF", "webp": "WEBP", "apng": "PNG"}
+extensions = {"gif": "gif", "webp": "webp", "apng": "png"}
+
+# how many frames are sampled, and how far each is shrunk, to build the shared palette
+palette_samples = 8
+palette_reduce = 4
+webp_quality = 80
+
+
+# the encoded file, with what it took to make it
+class Animation(io.BytesIO):
+	def __init__(self, fmt: str, frames: int):
+		super().__init__()
+		self.format = fmt
+		self.frames = frames
+		self.seconds = 0.0
+
+	@property
+	def extension(self) -> str:
+		return extensions[self.format]
+
+	@property
+	def size(self) -> int:
+		return len(self.getbuffer())
+
+	def report(self) -> str:
+		return f"{self.frames} frames as {self.format.upper()} in {self.seconds:.2f}s, {self.size/1024:,.0f} KB"
+
+
+# one palette for the whole animation, from a few frames spread across it. plots are mostly flat
+# colour, so 255 colours covers them; the last index is left free
+def shared_palette(frames: List[Image.Image]) -> Image.Image:
+	step = max(1, len(frames) // palette_samples)
+	samples = [frame.reduce(palette_reduce) for frame in frames[::step]]
+
+	sheet = Image.new("RGB", (samples[0].width, sum(sample.height for sample in samples)))
+	top = 0
+	for sample in samples:
+		sheet.paste(sample, (0, top))
+		top += sample.height
+
+	return sheet.quantize(colors=255, method=Image.FASTOCTREE)
+
+
+def quantize(frames: List[Image.Image]) -> List[Image.Image]:
+	palette = shared_palette(frames)
+	# no dithering, so a pixel that didn't change maps to the same index in every frame
+	return [frame.quantize(palette=palette, dither=Image.NONE) for frame in frames]
+
+
+def webp_supported() -> bool:
+	return features.check("webp_anim") if "webp_anim" in features.features else features.check("webp")
+
+
+# encode frames (PIL images, or png buffers from matplotlib) as a gif, webp or apng.
+# webp falls back to gif when Pillow was built without it
+def encode(frames: list, fmt: str = "gif", duration: int = 250, loop: int = 0) -> Animation:
+	if fmt == "webp" and not webp_supported():
+		fmt = "gif"
+
+	start = time.perf_counter()
+	frames = [(Image.open(frame) if isinstance(frame, io.BytesIO) else frame).convert("RGB") for frame in frames]
+	result = Animation(fmt, len(frames))
+
+	if fmt == "webp":
+		# webp does its own frame differencing and needs no palette
+		frames[0].save(result, format=formats[fmt], save_all=True, append_images=frames[1:], duration=duration, loop=loop, quality=webp_quality, method=4)
+	else:
+		frames = quantize(frames)
+		options = {"default_image": False} if fmt == "apng" else {"optimize": False}
+		frames[0].save(result, format=formats[fmt], save_all=True, append_images=frames[1:], duration=duration, loop=loop, **options)
+
+	result.seconds = time.perf_counter() - start
+	return result
@@ -0,0 +1,176 @@
+import asyncio
+import io
+import os
+import subprocess
+import tempfile
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+
+
+# ffmpeg output settings per cached format: (file extension, codec arguments)
+FORMATS = {
+	"opus": ("ogg", ["-c:a", "libopus", "-b:a", "{bitrate}k", "-f", "ogg"]),
+}
+
+
+# transcoded audio kept on disk, keyed by video id and format.
+# least recently used files are evicted once the directory goes over its quota
+class AudioCache:
+	def __init__(self, directory, quota, fmt="opus", bitrate=128, workers=2, executable="ffmpeg", telemetry=None):
+		if fmt not in FORMATS:
+			raise ValueError(f"Unsupported audio cache format: {fmt}")
+
+		self.directory = directory
+		self.quota = quota
+		self.format = fmt
+		self.bitrate = bitrate
+		self.executable = executable
+		self.telemetry = telemetry
+
+		self._index = OrderedDict()
+		self._pending = {}
+		self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="transcode")
+
+		os.makedirs(directory, exist_ok=True)
+		self._scan()
+
+
+	# rebuild the lru index from what is already on disk, oldest access first
+	def _scan(self):
+		entries = []
+		for file in os.listdir(self.directory):
+			path = os.path.join(self.directory, file)
+
+			try:
+				stat = os.stat(path)
+			except FileNotFoundError:
+				continue
+
+			# leftovers from a transcode that was interrupted. recent ones may still be in progress in another instance
+			if file.endswith(".part"):
+				if stat.st_mtime < time.time() - 3600:
+					os.remove(path)
+				continue
+
+			entries.append((stat.st_mtime, path, stat.st_size))
+
+		for _, path, size in sorted(entries):
+			self._index[path] = size
+
+
+	def path(self, video_id):
+		ext = FORMATS[self.format][0]
+		return os.path.join(self.directory, f"{video_id}.{self.format}.{ext}")
+
+
+	@property
+	def size(self):
+		return sum(self._index.values())
+
+
+	def __len__(self):
+		return len(self._index)
+
+
+	def get(self, video_id):
+		path = self.path(video_id)
+		if path not in self._index:
+			return None
+
+		if not os.path.exists(path):
+			del self._index[path]
+			return None
+
+		self._index.move_to_end(path)
+		os.utime(path)
+		return path
+
+
+	# return the cached file for video_id, transcoding it first if needed.
+	# download is called with a writable buffer and must fill it with the source audio
+	async def fetch(self, video_id, download):
+		path = self.get(video_id)
+		if path is not None:
+			return path
+
+		future = self._pending.get(video_id)
+		if future is None:
+			loop = asyncio.get_event_loop()
+			future = loop.run_in_executor(self._executor, self._transcode, download, self.path(video_id))
+			self._pending[video_id] = future
+			future.add_done_callback(lambda f: self._done(video_id, f))
+
+		return await asyncio.shield(future)
+
+
+	# start fetching in the background so the file is ready by the time it's needed
+	def prefetch(self, video_id, download):
+		def report(task):
+			if not task.cancelled() and task.exception() is not None:
+				print(f"Audio cache prefetch failed for {video_id}\nError: {task.exception()}")
+
+		task = asyncio.ensure_future(self.fetch(video_id, download))
+		task.add_done_callback(report)
+		return task
+
+
+	def _done(self, video_id, future):
+		self._pending.pop(video_id, None)
+
+		if future.cancelled() or future.exception() is not None:
+			return
+
+		path = future.result()
+		self._index[path] = os.path.getsize(path)
+		self._index.move_to_end(path)
+		self._evict()
+
+
+	def _evict(self):
+		total = self.size
+		while total > self.quota and len(self._index) > 1:
+			path, size = self._index.popitem(last=False)
+			total -= size
+
+			try:
+				os.remove(path)
+			except FileNotFoundError:
+				pass
+
+
+	# runs in the executor; writes to a temporary file and renames it so readers never see a partial file
+	def _transcode(self, download, path):
+		buf = io.BytesIO()
+		with self._timer("download"):
+			download(buf)
+
+		args = [self.executable, "-i", "-", "-vn", "-ar", "48000", "-ac", "2", "-loglevel", "warning"]
+		args.extend(arg.format(bitrate=self.bitrate) for arg in FORMATS[self.format][1])
+
+		fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".part")
+		os.close(fd)
+		args.extend(("-y", tmp))
+
+		try:
+			with self._timer("transcode"):
+				proc = subprocess.run(args, input=buf.getvalue(), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+			if proc.returncode != 0:
+				raise RuntimeError(f"ffmpeg exited with {proc.returncode}: {proc.stderr.decode(errors='replace').strip()}")
+
+			os.replace(tmp, path)
+		except BaseException:
+			if os.path.exists(tmp):
+				os.remove(tmp)
+			raise
+
+		return path
+
+
+	def _timer(self, name):
+		return self.telemetry.timer(name) if self.telemetry is not None else nullcontext()
+
+
+	def close(self):
+		self._executor.shutdown(wait=False)
@@ -1,27 +1,88 @@
 # init
+import time
+started = time.perf_counter()
+
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
 import os
 from datetime import date, datetime
 import process
+from mongo import buffer
+from mongo import db as mongo
+from guild_settings import SettingsCache
+from reloader import Reloader
+from cluster import Cluster
+import memory_profile
+from metrics import Metrics
+import lazy
 import logging
 
+lazy.import_times['bot.py imports'] = time.perf_counter() - started
+
 # load and read configurations
 load_dotenv()
 TOKEN = os.getenv("TOKEN");
 DEV = os.getenv("DEV");
-Config = process.readjson('config.json')
+Config = process.loadjson('config.json')
 logging.basicConfig(level=logging.INFO)
 prefix = Config.prefix
 
 if DEV == 'True':
     prefix = os.getenv("PREFIX")
 
-# define NerdBot class
-class NerdBot(commands.Bot):
+# resolve the prefix from the in-memory settings cache; runs on every message so it must never wait on the database
+def get_prefix(bot, message):
+    return bot.settings.for_guild(message.guild).prefix
+
+# define NerdBot class. auto sharded, so it runs every shard itself or, under the cluster launcher, the range it was given
+class NerdBot(commands.AutoShardedBot):
     def __init__(self):
-        super().__init__(command_prefix=prefix)
+        self.cluster = Cluster.from_env(mongo.db.clusters, Config.cluster.report_interval)
+        super().__init__(command_prefix=get_prefix, shard_ids=self.cluster.shard_ids, shard_count=self.cluster.shard_count, **memory_profile.client_options(Config.memory))
+        self._log_channel = None
+        self.fetched_users = memory_profile.UserCache(Config.memory.user_cache_size)
+        self.settings = SettingsCache(mongo.db.settings, prefix, Config.default_embed_colour, ttl=Config.settings_ttl)
+        self.add_check(self.cog_enabled)
+        self.reloader = Reloader(self)
+        if Config.hot_reload:
+            self.loop.create_task(self.reloader.run())
+        self.loop.create_task(self.cluster.run(self))
+
+        self.metrics = Metrics()
+        self.metrics.install(self)
+        if Config.metrics.enabled:
+            # clusters on the same host each take the next port up
+            self.loop.create_task(self.metrics.serve(Config.metrics.host, Config.metrics.port + (self.cluster.cluster_id or 0)))
+
+    # users are only cached while they're in a message or voice channel we see, anyone else is fetched once and remembered
+    async def get_or_fetch_user(self, user_id):
+        user = self.get_user(user_id) or self.fetched_users.get(user_id)
+        if user is None:
+            try:
+                user = await self.fetch_user(user_id)
+            except discord.NotFound:
+                return None
+            self.fetched_users.put(user)
+        return user
+
+    # the home guild may be on another cluster's shard, in which case the channel is fetched over http once
+    async def log_channel(self):
+        if self._log_channel is None:
+            self._log_channel = self.get_channel(Config.log_channel) or await self.fetch_channel(Config.log_channel)
+        return self._log_channel
+
+    # commands from cogs a guild has disabled are refused, the settings cog itself can't be disabled
+    async def cog_enabled(self, ctx):
+        if ctx.guild is None or ctx.cog is None or ctx.cog.qualified_name == 'Settings':
+            return True
+        return ctx.cog.qualified_name not in self.settings.get(ctx.guild.id).disabled_cogs
+
+    # flush buffered database writes before disconnecting
+    async def close(self):
+        await self.metrics.close()
+        await buffer.close_all()
+        await super().close()
 
 # create bot instance
 bot = NerdBot()
@@ -32,15 +93,25 @@ bot.remove_cog('general')
 for file in os.listdir("cogs"):
     if file.endswith('.py'):
         name = file[:-3]
-        bot.load_extension(f"cogs.{name}")
+        with lazy.timed(f"cogs.{name}"):
+            bot.load_extension(f"cogs.{name}")
 
 
 @bot.event
 async def on_ready():
     await bot.change_presence(activity=discord.Game("nerding"))
-    print("Nerdbot started at {0}\nLoaded {1} cog(s) and commands: {2}".format(datetime.now().strftime("%H:%M:%S"), len(bot.cogs), bot.command_prefix))
+    await bot.settings.warm([guild.id for guild in bot.guilds])
+    print("Nerdbot started at {0}\nLoaded {1} cog(s) and commands: {2}".format(datetime.now().strftime("%H:%M:%S"), len(bot.cogs), prefix))
+    print(f"Running {bot.cluster.name} with {len(bot.shards)} shard(s) and {len(bot.guilds)} guild(s)")
+    cache = memory_profile.cache_report(bot)
+    print(f"Cached {cache['members']} member(s), {cache['users']} user(s) and {cache['messages']} message(s), RSS {cache['rss'] // 1048576} MB")
+    print(f"Ready {time.perf_counter() - started:.2f}s after launch. Slowest imports:\n{lazy.report()}")
+
+    # heavy dependencies were left lazy to get here quickly, load them now before anyone needs them
+    bot.loop.create_task(lazy.warm())
     if DEV == "False":
-        channel = bot.get_guild(Config.home_guild).get_channel(Config.log_channel)
-        await channel.send(embed=discord.Embed(title="Nerdbot ready!", timestamp=datetime.now()))
+        channel = await bot.log_channel()
+        title = f"Nerdbot ready! ({bot.cluster.name})" if bot.cluster.clustered else "Nerdbot ready!"
+        await channel.send(embed=discord.Embed(title=title, timestamp=datetime.now()))
 
 bot.run(TOKEN)
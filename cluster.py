@@ -0,0 +1,178 @@
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+
+# a cluster is one bot process running a contiguous range of shards. the launcher (python cluster.py)
+# starts one per core and passes each its shards through the environment; a bot started on its own
+# has no cluster and lets discord.py pick the shard count for a single process.
+# mongo is only imported where it's used, so the launcher itself never connects to it, and requests
+# is only imported by the launcher, so the bot doesn't load it at startup
+
+identify_interval = 5
+
+
+# which shards this process runs, and the guild count shared with the other clusters through mongo
+class Cluster:
+    def __init__(self, cluster_id=None, shard_ids=None, shard_count=None, coll=None, interval=60):
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.coll = coll
+        self.interval = interval
+
+    @classmethod
+    def from_env(cls, coll=None, interval=60):
+        if not os.getenv("CLUSTER_ID"):
+            return cls(coll=coll, interval=interval)
+
+        shard_ids = [int(shard) for shard in os.getenv("SHARD_IDS").split(",")]
+        return cls(int(os.getenv("CLUSTER_ID")), shard_ids, int(os.getenv("SHARD_COUNT")), coll, interval)
+
+    @property
+    def clustered(self):
+        return self.cluster_id is not None
+
+    @property
+    def name(self):
+        return f"cluster {self.cluster_id} (shards {self.shard_ids[0]}-{self.shard_ids[-1]} of {self.shard_count})" if self.clustered else "single process"
+
+    # whether a guild is served by this process, by discord's shard formula
+    def owns(self, guild_id):
+        return not self.clustered or (guild_id >> 22) % self.shard_count in self.shard_ids
+
+    # best effort; a missed report is made up by the next one
+    async def publish(self, bot):
+        if not self.clustered:
+            return
+
+        from mongo import aio
+        from pymongo.errors import PyMongoError
+        doc = {"guilds": len(bot.guilds), "shards": self.shard_ids, "updated_at": datetime.utcnow()}
+        try:
+            await aio.run(self.coll.update_one, {"_id": self.cluster_id}, {"$set": doc}, upsert=True)
+        except PyMongoError as e:
+            print(f"Cluster {self.cluster_id} could not publish its guild count\nError:{e}")
+
+    async def run(self, bot):
+        await bot.wait_until_ready()
+        while not bot.is_closed():
+            await self.publish(bot)
+            await asyncio.sleep(self.interval)
+
+    # guilds across every cluster: ours counted live, the others as they last reported.
+    # a cluster that hasn't reported for a few intervals is taken to be down and left out.
+    # raises PyMongoError when the other clusters' counts can't be read, rather than undercounting
+    async def guild_count(self, bot):
+        if not self.clustered:
+            return len(bot.guilds)
+
+        from mongo import aio
+        cutoff = datetime.utcnow() - timedelta(seconds=3*self.interval)
+        others = await aio.run(lambda: list(self.coll.find({"_id": {"$ne": self.cluster_id}, "updated_at": {"$gte": cutoff}}, {"guilds": 1})))
+        return len(bot.guilds) + sum(doc["guilds"] for doc in others)
+
+
+######## launcher ##########
+
+def recommended_shards(token):
+    import requests
+    r = requests.get("https://discord.com/api/v8/gateway/bot", headers={"Authorization": f"Bot {token}"}, timeout=10)
+    r.raise_for_status()
+    return r.json()["shards"]
+
+
+# split shard ids into contiguous ranges, as even as possible
+def shard_ranges(shard_count, processes):
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+
+    ranges, start = [], 0
+    for ix in range(processes):
+        end = start + size + (ix < extra)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+# runs every cluster as a child process and restarts any that die, backing off if one keeps crashing
+class Launcher:
+    def __init__(self, shard_count, processes):
+        self.shard_count = shard_count
+        self.ranges = shard_ranges(shard_count, processes)
+        self.children = {}
+        self.restarts = {}
+        self.pending = {}
+        self.stopping = False
+
+    def start(self, cluster_id):
+        env = dict(os.environ,
+            CLUSTER_ID=str(cluster_id),
+            SHARD_IDS=",".join(map(str, self.ranges[cluster_id])),
+            SHARD_COUNT=str(self.shard_count)
+        )
+        self.children[cluster_id] = (subprocess.Popen([sys.executable, "bot.py"], env=env), time.monotonic())
+        print(f"Launcher: started cluster {cluster_id} with shards {self.ranges[cluster_id]}")
+
+    def stop(self, *args):
+        self.stopping = True
+        for process, started in self.children.values():
+            process.terminate()
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        for cluster_id, shards in enumerate(self.ranges):
+            self.start(cluster_id)
+            # discord allows one identify every few seconds; give each cluster time to identify its shards
+            time.sleep(identify_interval * len(shards))
+            if self.stopping:
+                break
+
+        while self.children or self.pending:
+            time.sleep(1)
+            if self.stopping:
+                self.pending.clear()
+
+            now = time.monotonic()
+            for cluster_id, restart_at in list(self.pending.items()):
+                if now >= restart_at:
+                    del self.pending[cluster_id]
+                    self.start(cluster_id)
+
+            for cluster_id, (process, started) in list(self.children.items()):
+                if process.poll() is None:
+                    continue
+
+                del self.children[cluster_id]
+                if self.stopping:
+                    continue
+
+                # a cluster that ran for a while before dying is restarted quickly, one that keeps crashing backs off
+                failures = 0 if now - started > 600 else self.restarts.get(cluster_id, 0) + 1
+                self.restarts[cluster_id] = failures
+                delay = min(300, identify_interval * 2**failures)
+                print(f"Launcher: cluster {cluster_id} exited with {process.returncode}, restarting in {delay}s")
+                self.pending[cluster_id] = now + delay
+
+
+def main():
+    from process import loadjson
+    load_dotenv()
+    config = loadjson('config.json')
+
+    shard_count = config.cluster.shards or recommended_shards(os.getenv("TOKEN"))
+    processes = config.cluster.processes or os.cpu_count()
+    print(f"Launcher: {shard_count} shard(s) over {min(processes, shard_count)} process(es)")
+
+    Launcher(shard_count, processes).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,13 @@
 import discord
 from discord.ext import commands
-from process import readjson, colour_convert
-import requests
-import html_module
+from process import loadjson, colour_convert
+from lazy import lazy_import
+requests = lazy_import('requests')
+html_module = lazy_import('html_module')
 
 
-config = readjson('config.json')
-speech = readjson('speech.json')
+config = loadjson('config.json')
+speech = loadjson('speech.json')
 
 
 class Coding(commands.Cog):
@@ -0,0 +1,39 @@
+import discord
+from discord.ext import commands
+import io
+import json
+import process
+import memory_profile
+
+config = process.loadjson('config.json')
+speech = process.loadjson('speech.json')
+
+class Diagnostics(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.hidden = True
+        self.name = 'Diagnostics'
+
+    @commands.is_owner()
+    @commands.command(hidden=True, help=speech.help.cachestats, brief=speech.brief.cachestats)
+    async def cachestats(self, ctx, fmt=None):
+        report = memory_profile.cache_report(self.bot)
+
+        if fmt == "json":
+            buf = io.BytesIO(json.dumps(report, indent=2).encode())
+            return await ctx.send(file=discord.File(buf, "cachestats.json"))
+
+        embed = discord.Embed(title="Cache stats :floppy_disk:", colour=config.default_embed_colour)
+        embed.add_field(name="Guilds", value=report["guilds"])
+        embed.add_field(name="Members", value=report["members"])
+        embed.add_field(name="Users", value=f"{report['users']} cached, {report['fetched_users']} fetched")
+        embed.add_field(name="Messages", value=report["messages"])
+        embed.add_field(name="RSS", value=f"{report['rss'] // 1048576} MB, {report['rss_per_1000_guilds'] // 1048576} MB per 1000 guilds")
+
+        biggest = "\n".join(f"{g['name']}: {g['members']} members, {g['channels']} channels, {g['roles']} roles, {g['emojis']} emojis, {g['voice_states']} in voice" for g in report["per_guild"][:10])
+        embed.add_field(name="Biggest guilds", value=biggest[:1024] or "None", inline=False)
+
+        await ctx.send(embed=embed)
+
+def setup(bot):
+    bot.add_cog(Diagnostics(bot))
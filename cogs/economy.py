@@ -0,0 +1,56 @@
+import discord
+from discord.ext import commands
+import process
+import time
+from collections import OrderedDict
+from mongo import balance
+from memory_profile import LazyUser
+
+config = process.loadjson('config.json')
+speech = process.loadjson('speech.json')
+
+class Economy(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.hidden = False
+        self.name = 'Economy'
+        # user id -> when they were last rewarded, oldest first
+        self.last_reward = OrderedDict()
+
+    def export_state(self):
+        return self.last_reward
+
+    def import_state(self, state):
+        self.last_reward = OrderedDict(sorted(state.items(), key=lambda item: item[1]))
+
+    # reward chatting, at most once per cooldown per user. only touches the in-memory write buffer
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        if message.author.bot or message.guild is None:
+            return
+
+        # users whose cooldown has run out are forgotten, so this only holds recent chatters
+        now = time.monotonic()
+        while self.last_reward and now - next(iter(self.last_reward.values())) >= config.economy.reward_cooldown:
+            self.last_reward.popitem(last=False)
+
+        if message.author.id in self.last_reward:
+            return
+
+        self.last_reward[message.author.id] = now
+        balance.add(message.author, config.economy.message_reward)
+
+    @commands.command(help=speech.help.balance, brief=speech.brief.balance, aliases=['bal'])
+    async def balance(self, ctx, user: LazyUser=None):
+        user = user or ctx.author
+        bal = await balance.get(user.id)
+        await ctx.send(embed=discord.Embed(description=f"**{user.name}** has **{bal}** nerdcoins", colour=self.bot.settings.for_guild(ctx.guild).embed_colour))
+
+    @commands.command(help=speech.help.leaderboard, brief=speech.brief.leaderboard, aliases=['lb'])
+    async def leaderboard(self, ctx):
+        docs = await balance.leaderboard(10)
+        text = "\n".join(f"**{ix+1}.** {doc.get('name')} - {doc.get('bal', 0)}" for ix, doc in enumerate(docs))
+        await ctx.send(embed=discord.Embed(title="Leaderboard", description=text or "Nobody has any nerdcoins yet!", colour=self.bot.settings.for_guild(ctx.guild).embed_colour))
+
+def setup(bot):
+    bot.add_cog(Economy(bot))
@@ -1,34 +1,85 @@
 import discord
 from discord.ext import commands
 import datetime
-from process import readjson
+from pymongo.errors import PyMongoError
+from process import loadjson
 from mongo import db as mongo
+from mongo import buffer
+from mongo import aio
+from mongo import schema
 db = mongo.db
+guilds = buffer.get(db.guilds)
 
-speech = readjson('speech.json')
-config = readjson('config.json')
+speech = loadjson('speech.json')
+config = loadjson('config.json')
 
 class EventHandler(commands.Cog):
     def __init__(self, bot):
         self.hidden = True
         self.bot = bot
 
+    # bring the guilds collection in line with the guilds we're actually in, catching any joins or
+    # leaves that happened while the bot was offline. one projected scan, one bulk insert and one delete
+    @commands.Cog.listener()
+    async def on_ready(self):
+        try:
+            await self.reconcile()
+        except PyMongoError as e:
+            print(f"Guild reconciliation skipped: the database didn't answer\nError:{e}")
+
+    async def reconcile(self):
+        created = await aio.run(schema.ensure_indexes, db, timeout=60)
+        if created:
+            print(f"Created missing indexes: {created}")
+
+        await guilds.flush()
+
+        stored = await aio.run(lambda: {doc["_id"] for doc in db.guilds.find({}, {"_id": 1})}, timeout=60)
+
+        # under the cluster launcher other processes own the rest of the guilds, so only ours are reconciled
+        current = {guild.id: guild for guild in self.bot.guilds}
+        missing = [guild for guild_id, guild in current.items() if guild_id not in stored]
+        stale = [guild_id for guild_id in stored if guild_id not in current and self.bot.cluster.owns(guild_id)]
+
+        if missing:
+            result = await aio.bulkInsert(missing, mongo.guildModel, db.guilds, timeout=60)
+            print(f"Guild reconciliation: added {len(missing)} guild(s) joined while offline {result}")
+        if stale:
+            await aio.remove({"_id": {"$in": stale}}, db.guilds, timeout=60)
+            print(f"Guild reconciliation: removed {len(stale)} guild(s) left while offline")
+        if not missing and not stale:
+            print(f"Guild reconciliation: {len(current)} guild(s) already in sync")
+
+    # total across clusters, or a note saying it isn't known rather than a number that's too low
+    async def guild_count_text(self):
+        try:
+            return f"Currently in {await self.bot.cluster.guild_count(self.bot)} servers!"
+        except PyMongoError:
+            return "Server count unavailable, the database didn't answer."
+
     @commands.Cog.listener()
     async def on_guild_join(self, guild):
-        mongo.insert(guild, mongo.guildModel, db.guilds)
-        channel = self.bot.get_guild(config.home_guild).get_channel(config.log_channel)
-        await channel.send(embed=discord.Embed(title="Joined new server!", description=f"**Name:** {guild.name}\n**Size:** {guild.member_count-1} members\nCurrently in {len(self.bot.guilds)} servers!"))
+        guilds.insert(mongo.guildModel(guild))
+        await self.bot.cluster.publish(self.bot)
+        count = await self.guild_count_text()
+        channel = await self.bot.log_channel()
+        await channel.send(embed=discord.Embed(title="Joined new server!", description=f"**Name:** {guild.name}\n**Size:** {guild.member_count-1} members\n{count}"))
 
     @commands.Cog.listener()
     async def on_guild_remove(self, guild):
-        mongo.remove({"_id": guild.id}, db.guilds)
-        channel = self.bot.get_guild(config.home_guild).get_channel(config.log_channel)
-        await channel.send(embed=discord.Embed(title="Left a server!", description=f"**Name:** {guild.name}\n**Size:** {guild.member_count-1} members\nCurrently in {len(self.bot.guilds)} servers!"))
+        guilds.delete(guild.id)
+        await self.bot.cluster.publish(self.bot)
+        count = await self.guild_count_text()
+        channel = await self.bot.log_channel()
+        await channel.send(embed=discord.Embed(title="Left a server!", description=f"**Name:** {guild.name}\n**Size:** {guild.member_count-1} members\n{count}"))
 
 
     @commands.Cog.listener()
     async def on_command_error(self, ctx, error):
         print(error)
+        if isinstance(getattr(error, "original", None), PyMongoError):
+            return await ctx.send("The database is unavailable right now, try again in a bit.")
+
         if isinstance(error, commands.MissingPermissions):
             return await ctx.send(speech.err.noperm.format(error.missing_perms))
 
@@ -38,7 +89,7 @@ class EventHandler(commands.Cog):
         if isinstance(error, commands.UserInputError):
             helpstr = "Incorrect usage"
             try:
-                helpstr = getattr(speech.help, ctx.command.name).format(config.prefix)
+                helpstr = getattr(speech.help, ctx.command.name).format(ctx.prefix)
             except:
                 print(f"warning: {ctx.command.name} has no usage description")
 
@@ -5,8 +5,10 @@ import random
 import flagparser
 
 
-config = process.readjson('config.json')
-speech = process.readjson('speech.json')
+config = process.loadjson('config.json')
+speech = process.loadjson('speech.json')
+
+embed_flags = flagparser.FlagGrammar({'-t': flagparser.text, '-c': flagparser.colour, '-a': bool})
 
 
 class Fun(commands.Cog):
@@ -18,7 +20,7 @@ class Fun(commands.Cog):
     @commands.command(help=speech.help.say, brief=speech.brief.say)
     async def say(self, ctx, *, args):
         if not args:
-            raise UserInputError
+            raise commands.UserInputError
 
         await ctx.send(args)
         await ctx.message.delete()
@@ -26,24 +28,21 @@ class Fun(commands.Cog):
     @commands.command(help=speech.help.embed, brief=speech.brief.embed, aliases=['e'])
     async def embed(self, ctx, *, args):
         if not args:
-            raise UserInputError
-
-        flags = ('-t', '-c', '-a')
-        args = flagparser.format(args, flags, False)
-        title = ""
-        colour = config.default_embed_colour
-        if not 'content' in args.keys():
-            raise UserInputError
+            raise commands.UserInputError
 
-        if '-c' in args.keys():
-            colour = int(args['-c'])
+        try:
+            args = embed_flags.parse(args)
+        except flagparser.FlagError as e:
+            raise commands.BadArgument(str(e))
 
-        if '-t' in args.keys():
-            title = args['-t']
+        title = args.get('-t', "")
+        colour = args.get('-c', self.bot.settings.for_guild(ctx.guild).embed_colour)
+        if not args['content']:
+            raise commands.UserInputError
 
         embed=discord.Embed(title=title, description=args['content'], colour=colour)
 
-        if '-a' not in args.keys():
+        if not args['-a']:
             embed.set_author(name=ctx.author.name, icon_url=ctx.author.avatar_url)
 
         await ctx.send(embed=embed)
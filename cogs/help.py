@@ -1,10 +1,10 @@
 import discord
 from discord.ext import commands
-from process import readjson
+from process import loadjson
 from datetime import datetime
 
-Config = readjson('config.json')
-speech = readjson('speech.json')
+Config = loadjson('config.json')
+speech = loadjson('speech.json')
 
 class Help(commands.Cog):
     def __init__(self, bot):
@@ -14,9 +14,10 @@ class Help(commands.Cog):
 
     @commands.command()
     async def help(self, ctx, *args):
+        colour = self.bot.settings.for_guild(ctx.guild).embed_colour
         if not args:
-            embed = discord.Embed(title=":bar_chart: Help :bar_chart:", colour=int(Config.default_embed_colour))
-            embed.description = f"{speech.helpembed.helptext}".format(Config.prefix)
+            embed = discord.Embed(title=":bar_chart: Help :bar_chart:", colour=colour)
+            embed.description = f"{speech.helpembed.helptext}".format(ctx.prefix)
 
             for c in self.bot.cogs:
                 cog = self.bot.get_cog(c)
@@ -24,7 +25,7 @@ class Help(commands.Cog):
                     text=""
                     for cmd in cog.get_commands():
                         if not cmd.hidden:
-                            text += f"{Config.prefix}{cmd.name}\n"
+                            text += f"{ctx.prefix}{cmd.name}\n"
                     embed.add_field(name=c, value=text)
 
             embed.add_field(name="Links and support", value="If you like me, please consider voting for me [here](https://discordbotlist.com/bots/nerdbot)!\n[Github repository](https://github.com/xmatea/nerdbot)", inline=False)
@@ -35,7 +36,7 @@ class Help(commands.Cog):
             cog = self.bot.get_cog(args[0].lower().capitalize())
             if not cog.hidden:
                 text=""
-                embed = discord.Embed(title=f"{cog.name} commands",colour=int(Config.default_embed_colour))
+                embed = discord.Embed(title=f"{cog.name} commands",colour=colour)
                 for cmd in cog.get_commands():
                     text += f"`{cmd.name}` - {cmd.brief}\n"
                 embed.add_field(name="Full list of commands", value=text)
@@ -45,8 +46,8 @@ class Help(commands.Cog):
         elif self.bot.get_command(args[0].lower()):
             cmd = self.bot.get_command(args[0].lower())
             if not cmd.hidden:
-                embed = discord.Embed(title=f"{cmd.name.capitalize()}",colour=int(Config.default_embed_colour))
-                text = f"{cmd.help}".format(Config.prefix)
+                embed = discord.Embed(title=f"{cmd.name.capitalize()}",colour=colour)
+                text = f"{cmd.help}".format(ctx.prefix)
                 embed.add_field(name="Help and usage", value=text)
                 try:
                     flagstr = ""
@@ -1,17 +1,17 @@
 import discord
 from discord.ext import commands
-from process import readjson, colour_convert
+from process import loadjson, colour_convert
 import random
-from PIL import Image
-import requests
 from io import BytesIO
-import numpy
-import html_module
-from image_processing import generate_palette
+from lazy import lazy_import
+Image = lazy_import('PIL.Image')
+requests = lazy_import('requests')
+numpy = lazy_import('numpy')
+image_processing = lazy_import('image_processing')
 import random
 
-Config = readjson('config.json')
-speech = readjson('speech.json')
+Config = loadjson('config.json')
+speech = loadjson('speech.json')
 
 class Images(commands.Cog):
     def __init__(self, bot):
@@ -24,7 +24,7 @@ class Images(commands.Cog):
         url = ctx.message.attachments[0].url
         img = Image.open(requests.get(url, stream=True).raw).convert('RGB')
 
-        palette = generate_palette(img)
+        palette = image_processing.generate_palette(img)
         palette.seek(0)
 
         await ctx.send(file=discord.File(palette, "palette.png"))
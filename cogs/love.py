@@ -4,8 +4,8 @@ import process
 import random
 
 
-config = process.readjson('config.json')
-speech = process.readjson('speech.json')
+config = process.loadjson('config.json')
+speech = process.loadjson('speech.json')
 
 
 class Love(commands.Cog):
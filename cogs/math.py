@@ -2,24 +2,37 @@ import discord
 from discord.ext import commands
 import process
 import random
-import graphing
-import re
+import io
+from lazy import lazy_import
 import flagparser
-import mathparser as mp
+mp = lazy_import('mathparser')
+plot_planner = lazy_import('plot_planner')
+from sandbox import Sandbox, SandboxError, SandboxTimeout
 
-config = process.readjson('config.json')
-speech = process.readjson('speech.json')
+config = process.loadjson('config.json')
+speech = process.loadjson('speech.json')
+
+# discord's upload limit for bots without boosts
+max_upload_size = 8*1024*1024
+
+plot_flags = flagparser.FlagGrammar({'-range': flagparser.ranges, '-rt': bool, '-format': flagparser.choice('gif', 'webp', 'apng')})
 
 class Math(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.hidden = False
         self.name = 'Math'
+        self.sandbox = Sandbox(workers=config.sandbox.workers, timeout=config.sandbox.plot_timeout, memory_mb=config.sandbox.memory_mb)
 
 
     @commands.command(help=speech.help.calculate, brief=speech.brief.calculate, aliases=['calc','c', 'cal'])
     async def calculate(self, ctx, *, expr):
-        res = mp.evaluate(expr)
+        try:
+            res = await self.sandbox.run(mp.evaluate, expr, timeout=config.sandbox.calc_timeout)
+        except SandboxTimeout:
+            return await ctx.send(f"That took too long to calculate, I gave up after {config.sandbox.calc_timeout}s.")
+        except SandboxError as e:
+            return await ctx.send(f"I couldn't calculate that: {e}")
 
         await ctx.send(content="", embed= discord.Embed(title=f"`{expr} = {res}`"))
 
@@ -28,103 +41,53 @@ class Math(commands.Cog):
     async def plot(self, ctx, *, args):
         if not args:
             raise commands.UserInputError()
+
+        try:
+            args = plot_flags.parse(args)
+            # range bounds are expressions too, so the plan is made in the sandbox under the calculate timeout
+            plan = await self.sandbox.run(plot_planner.plan_job, args['content'], args.get('-range', {}), args['-rt'], config.max_plot_evaluations, config.plot_target_seconds, max_upload_size, config.plot_engine, args.get('-format', 'gif'), timeout=config.sandbox.calc_timeout)
+        except (flagparser.FlagError, plot_planner.PlanError) as e:
+            await ctx.send(f"An error occurred!\nError: {e}")
+            raise commands.UserInputError()
+        except SandboxTimeout:
+            return await ctx.send(f"Working out that plot took too long, I gave up after {config.sandbox.calc_timeout}s.")
+        except SandboxError as e:
+            return await ctx.send(f"I couldn't plot that: {e}")
+
+        description = f"Generating {plan.frames} frames. Please wait..." if plan.is_animation else "Generating. Please wait..."
+        # tell them up front when the plot had to be made coarser to be drawn in time
+        note = f"That plot was too big to draw in time, so the {', '.join(plan.downgrades)}." if plan.downgrades else None
+        if note:
+            description = f"{note}\n{description}"
+        wait_message = await ctx.send(embed=discord.Embed(title=f"`Plotting {plan.expression}`", description=description))
+
         try:
-            flags = ('-range', '-rt')
-            bool_flags = {'-rt': False}
-            default_ranges = {'x': (0,10), 'y': (0,10), 'theta': (0, mp.evaluate('2*pi')), 'a': (0,10)}
-            ranges = {}
-            animation = False
-            surface = False
-            polar = False
-
-            args = flagparser.format(args, flags)
-            expression = args['content']
-
-            animation = len(re.compile(r'\b(a)\b').findall(expression)) > 0
-            surface = len(re.compile(r'\b(y)\b').findall(expression)) > 0
-            polar = len(re.compile(r'\b(theta)\b').findall(expression)) > 0
-
-            for flag in bool_flags.keys():
-                if flag in args:
-                    bool_flags[flag] = True
-
-            if '-range' in args.keys():
-                matches = re.findall('([a-zA-Z]+)=\[([^,\[\]]*),([^,\[\]]*)\]', args['-range'])
-                if not matches:
-                    raise commands.UserInputError()
-
-                for m in matches:
-                    ranges.update({m[0]: (mp.evaluate(m[1]), mp.evaluate(m[2])) })
-            else:
-                if animation: ranges.update({'a': default_ranges['a']})
-                if surface: ranges.update({'y': default_ranges['y']})
-
-                if polar:
-                    ranges.update({'theta': default_ranges['theta']})
-                else:
-                    ranges.update({'x': default_ranges['x']})
-
-            wait_message = await ctx.send(embed=discord.Embed(title=f"`Plotting {expression}`", description="Generating. Please wait..."))
-
-            # PLOT GRAPH
-            if polar:
-                if animation:
-                    buf = graphing.animated_polar(expression, ranges['theta'], ranges['a'])
-                    buf.seek(0)
-
-                    await ctx.send(file=discord.File(buf, "anim.gif"))
-                    await wait_message.delete()
-                else:
-                    buf = graphing.static_polar(expression, ranges['theta'])
-                    buf.seek(0)
-
-                    await ctx.send(file=discord.File(buf, "image.png"))
-                    await wait_message.delete()
-
-            elif surface:
-                if animation and bool_flags['-rt']:
-                    buf = graphing.animated_surface_rotate(expression, ranges['x'], ranges['y'], ranges['a'])
-                    buf.seek(0)
-
-                    await ctx.send(file=discord.File(buf, "anim.gif"))
-                    await wait_message.delete()
-                elif animation:
-                    buf = graphing.animated_surface(expression, ranges['x'], ranges['y'], ranges['a'])
-                    buf.seek(0)
-
-                    await ctx.send(file=discord.File(buf, "anim.gif"))
-                    await wait_message.delete()
-                elif bool_flags['-rt']:
-                    buf = graphing.static_surface_rotate(expression, ranges['x'], ranges['y'])
-                    buf.seek(0)
-
-                    await ctx.send(file=discord.File(buf, "anim.gif"))
-                    await wait_message.delete()
-                else:
-                    buf = graphing.static_surface(expression, ranges['x'], ranges['y'])
-                    buf.seek(0)
-
-                    await ctx.send(file=discord.File(buf, "image.png"))
-                    await wait_message.delete()
-
-            else:
-                if animation:
-                    buf = graphing.animated_cartesian(expression, ranges['x'], ranges['a'])
-                    buf.seek(0)
-
-                    await ctx.send(file=discord.File(buf, "anim.gif"))
-                    await wait_message.delete()
-                else:
-                    buf = graphing.static_cartesian(expression, ranges['x'])
-                    buf.seek(0)
-
-                    await ctx.send(file=discord.File(buf, "image.png"))
-                    await wait_message.delete()
+            # the first plan only validated and sized the job; the worker plans again and renders
+            image, filename, report = await self.sandbox.run(plot_planner.render_job, args['content'], args.get('-range', {}), args['-rt'], plan.quality, plan.engine, plan.fmt)
+
+            content = "\n".join(line for line in (note, report and f"Encoded {report}") if line) or None
+            await ctx.send(content=content, file=discord.File(io.BytesIO(image), filename))
+        except SandboxTimeout:
+            await ctx.send(f"That plot took too long to draw, I gave up after {config.sandbox.plot_timeout}s.")
         except Exception as e:
             await ctx.send(f"An error occurred!\nError: {e}")
-            await wait_message.delete()
 
             raise commands.UserInputError()
+        finally:
+            await wait_message.delete()
+
+    # keep the worker processes across a hot reload
+    def export_state(self):
+        self.exported = True
+        return self.sandbox
+
+    def import_state(self, sandbox):
+        self.sandbox.close()
+        self.sandbox = sandbox
+
+    def cog_unload(self):
+        if not getattr(self, 'exported', False):
+            self.sandbox.close()
 
 def setup(bot):
     bot.add_cog(Math(bot))
@@ -3,11 +3,11 @@ from discord.ext import commands
 from discord.ext.commands import has_permissions, MissingPermissions, BotMissingPermissions
 
 from mongo import db as mongo
-from process import readjson
+from process import loadjson
 import time
 
-Config = readjson('config.json')
-speech = readjson('speech.json')
+Config = loadjson('config.json')
+speech = loadjson('speech.json')
 
 class Moderation(commands.Cog):  
 	def __init__(self, bot): 
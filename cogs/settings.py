@@ -5,8 +5,8 @@ import random
 from mongo import db as mongo
 db = mongo.db
 
-config = process.readjson('config.json')
-speech = process.readjson('speech.json')
+config = process.loadjson('config.json')
+speech = process.loadjson('speech.json')
 
 class Settings(commands.Cog):
     def __init__(self, bot):
@@ -14,5 +14,60 @@ class Settings(commands.Cog):
         self.hidden = True
         self.name = 'Settings'
 
+    @commands.guild_only()
+    @commands.group(help=speech.help.settings, brief=speech.brief.settings, invoke_without_command=True)
+    async def settings(self, ctx):
+        settings = self.bot.settings.get(ctx.guild.id)
+        embed = discord.Embed(title=f"Settings for {ctx.guild.name}", colour=settings.embed_colour)
+        embed.add_field(name="Prefix", value=f"`{settings.prefix}`")
+        embed.add_field(name="Embed colour", value=f"#{settings.embed_colour:06x}")
+        embed.add_field(name="Disabled categories", value=", ".join(sorted(settings.disabled_cogs)) or "None", inline=False)
+        await ctx.send(embed=embed)
+
+    @commands.has_permissions(manage_guild=True)
+    @settings.command()
+    async def prefix(self, ctx, *, prefix):
+        # a trailing space is allowed so prefixes like "nerdbot " keep working
+        if not prefix.strip() or len(prefix) > 16:
+            raise commands.BadArgument
+        await self.bot.settings.set(ctx.guild.id, prefix=prefix)
+        await ctx.send(f"Prefix set to `{prefix}`")
+
+    @commands.has_permissions(manage_guild=True)
+    @settings.command(aliases=['color'])
+    async def colour(self, ctx, colour):
+        try:
+            value = int(colour.lstrip('#'), 16) if colour.startswith('#') else int(colour)
+        except ValueError:
+            raise commands.BadArgument
+        if not 0 <= value <= 0xFFFFFF:
+            raise commands.BadArgument
+        await self.bot.settings.set(ctx.guild.id, embed_colour=value)
+        await ctx.send(embed=discord.Embed(description="Embed colour updated!", colour=value))
+
+    @commands.has_permissions(manage_guild=True)
+    @settings.command()
+    async def disable(self, ctx, cog):
+        cog = self.bot.get_cog(cog.lower().capitalize())
+        if cog is None or cog.qualified_name == self.qualified_name:
+            raise commands.BadArgument
+        disabled = self.bot.settings.get(ctx.guild.id).disabled_cogs | {cog.qualified_name}
+        await self.bot.settings.set(ctx.guild.id, disabled_cogs=sorted(disabled))
+        await ctx.send(f"Disabled {cog.qualified_name} commands in this server.")
+
+    @commands.has_permissions(manage_guild=True)
+    @settings.command()
+    async def enable(self, ctx, cog):
+        cog = cog.lower().capitalize()
+        disabled = self.bot.settings.get(ctx.guild.id).disabled_cogs - {cog}
+        await self.bot.settings.set(ctx.guild.id, disabled_cogs=sorted(disabled))
+        await ctx.send(f"Enabled {cog} commands in this server.")
+
+    @commands.has_permissions(manage_guild=True)
+    @settings.command()
+    async def reset(self, ctx):
+        await self.bot.settings.reset(ctx.guild.id)
+        await ctx.send("Settings reset to defaults.")
+
 def setup(bot):
     bot.add_cog(Settings(bot))
@@ -1,21 +1,26 @@
 import discord
 from discord.ext import commands
 import process
-from pytube import YouTube
+from lazy import lazy_import
+pytube = lazy_import('pytube')
 import io
+import json
 import asyncio
 import subprocess
 import shlex
 from discord.opus import Encoder
 import threading
+import time
 from datetime import datetime, timedelta
 from types import SimpleNamespace
 import re
-from youtubesearchpython import VideosSearch
+from youtube_resolver import Resolver
+from audio_cache import AudioCache
+from voice_telemetry import VoiceTelemetry, InstrumentedSource
 
 
-config = process.readjson('config.json')
-speech = process.readjson('speech.json')
+config = process.loadjson('config.json')
+speech = process.loadjson('speech.json')
 
 # better FFmpegPCMAudio class; thanks https://github.com/Armster15 <3 =========================================
 class FFmpegPCMAudio(discord.AudioSource):
@@ -46,6 +51,9 @@ class FFmpegPCMAudio(discord.AudioSource):
 		if len(ret) != Encoder.FRAME_SIZE:
 			return b''
 		return ret
+	def buffer_fill(self):
+		size = len(self._stdout.getbuffer())
+		return size - self._stdout.tell(), size
 	def cleanup(self):
 		proc = self._process
 		if proc is None:
@@ -62,28 +70,35 @@ class Song:
 		self.duration = yt.length
 		self.title = yt.title
 		self.image_url = yt.thumbnail_url
+		self.video_id = yt.video_id
 		self.url = url
 
 	def to_buffer(self, buf):
-		YouTube(self.url).streams.filter(only_audio=True).first().stream_to_buffer(buf)
+		pytube.YouTube(self.url).streams.filter(only_audio=True).first().stream_to_buffer(buf)
 
 
 class QueueItem:
-	def __init__(self, song, ctx, timer):
+	def __init__(self, song, ctx):
 		self.song = song
 		self.ctx = ctx
-		self.timer = timer
+		self.added = time.monotonic()
 
 
 	def __iter__(self):
-		return iter((self.song, self.ctx, self.timer))
+		return iter((self.song, self.ctx))
 
 
 class Queue: # make async
-	def __init__(self):
+	def __init__(self, cache, loop, telemetry, resolver):
 		self._items = []
+		self.cache = cache
+		self.resolver = resolver
+		self.loop = loop
+		self.telemetry = telemetry
 		self.ctx = None
 		self.is_paused = False
+		self.volume = 1.0
+		self.timer = None
 
 		self.current_song = SimpleNamespace(duration=0, title=None, url=None)
 		self.current_song_started = datetime.now()
@@ -92,35 +107,71 @@ class Queue: # make async
 		self.songs = lambda: [item.song for item in self._items]
 
 
-	def add(self, url, ctx):
-		yt = YouTube(url)
-
+	def add(self, url, ctx, yt):
 		song = Song(url, yt)
 
-		total_songs_duration = sum([s.duration for s in self.songs()])
-		delay = self.song_time_left() + timedelta(seconds=total_songs_duration)
-		delay = delay.total_seconds()
-		timer = threading.Timer(delay, self.play_next)
-
-		queue_item = QueueItem(song, ctx, timer)
+		queue_item = QueueItem(song, ctx)
 		self._items.append(queue_item)
 
-		timer.start()
+		# only warm the cache for songs close to playing, so long playlists don't transcode everything at once
+		if len(self._items) <= 2:
+			self.cache.prefetch(song.video_id, song.to_buffer)
+
+		# only the song at the head of the queue waits on a timer, the next one is armed when it starts
+		if self.timer is None:
+			self.schedule(max(0, self.song_time_left().total_seconds()))
+
+
+	def schedule(self, delay):
+		self.cancel_timer()
+		self.timer = threading.Timer(delay, self.on_timer)
+		self.timer.daemon = True
+		self.timer.start()
+
+
+	def cancel_timer(self):
+		if self.timer is not None:
+			self.timer.cancel()
+			self.timer = None
 
 
-	def play_next(self):
-		self.current_song, self.ctx, timer = self._items.pop(0)
+	# timers fire on their own threads, so starting the song is handed to the bot's loop
+	def on_timer(self):
+		def report(future):
+			if not future.cancelled() and future.exception() is not None:
+				print(f"Failed to play next song\nError: {future.exception()}")
+
+		timer = self.timer
+		asyncio.run_coroutine_threadsafe(self.timer_fired(timer), self.loop).add_done_callback(report)
+
+
+	# a timer that was cancelled or replaced after it fired, by a skip for example, is ignored
+	async def timer_fired(self, timer):
+		if timer is self.timer:
+			await self.play_next()
+
+
+	async def play_next(self):
+		self.cancel_timer()
+		if not self._items:
+			return
 
-		if timer.is_alive():
-			timer.cancel()
+		item = self._items.pop(0)
+		self.current_song, self.ctx = item
+
+		requested = time.monotonic()
+		self.telemetry.record("queue_wait", requested - item.added)
 
 		self.current_song_started = datetime.now()
 
-		buf = io.BytesIO()
-		self.current_song.to_buffer(buf)
-		buf.seek(0)
+		if self._items:
+			upcoming = self._items[0].song
+			self.cache.prefetch(upcoming.video_id, upcoming.to_buffer)
+			self.schedule(self.current_song.duration)
 
-		audio_source = FFmpegPCMAudio(buf.read(), pipe=True)
+		audio_source = await self.audio_source(self.current_song)
+		stream = self.telemetry.start_stream(self.ctx.guild.id, self.current_song.title, "opus" if audio_source.is_opus() else "pcm")
+		audio_source = InstrumentedSource(audio_source, self.telemetry, stream, self.current_song.duration, requested)
 
 		if self.ctx.voice_client.is_playing():
 			self.ctx.voice_client.stop()
@@ -129,6 +180,42 @@ class Queue: # make async
 		self.is_paused = False
 
 
+	# opus packets are passed through untouched unless the volume has been changed, which needs decoded pcm
+	async def audio_source(self, song):
+		path = self.cache.get(song.video_id)
+
+		if self.volume != 1.0:
+			if path is None:
+				path = await self.cache.fetch(song.video_id, song.to_buffer)
+			# FFmpegPCMAudio decodes the whole file up front
+			source = await self.loop.run_in_executor(None, FFmpegPCMAudio, path)
+			return discord.PCMVolumeTransformer(source, volume=self.volume)
+
+		if path is None:
+			try:
+				url = await self.resolver.opus_stream_url(song.url)
+			except Exception as e:
+				print(f"Couldn't find an opus stream for {song.url}, transcoding instead\nError: {e}")
+				url = None
+			if url is not None:
+				return discord.FFmpegOpusAudio(url, codec="opus", before_options="-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5")
+
+			path = await self.cache.fetch(song.video_id, song.to_buffer)
+
+		return discord.FFmpegOpusAudio(path, codec="opus")
+
+
+	def set_volume(self, volume):
+		self.volume = volume
+
+		source = self.ctx.voice_client.source if self.ctx is not None and self.ctx.voice_client else None
+		source = getattr(source, "original", source)
+		if isinstance(source, discord.PCMVolumeTransformer):
+			source.volume = volume
+			return True
+		return False
+
+
 	def pause(self):
 		if self.ctx is not None:
 			self.ctx.voice_client.pause()
@@ -153,11 +240,12 @@ class Queue: # make async
 		return songs
 
 
-	def skip(self, index):
+	async def skip(self, index):
 		if not index:
 			if len(self._items):
-				self.play_next()
+				await self.play_next()
 			else:
+				self.cancel_timer()
 				self.current_song = SimpleNamespace(duration=0, title=None, url=None)
 				self.ctx.voice_client.stop()
 		else:
@@ -170,8 +258,23 @@ class Voice(commands.Cog):
 		self.bot = bot
 		self.hidden = False
 		self.name = 'Voice'
-		self.queue = Queue()
+		self.telemetry = VoiceTelemetry()
+		self.audio_cache = AudioCache(
+			config.voice.audio_cache_dir,
+			config.voice.audio_cache_quota_mb * 1024 * 1024,
+			fmt=config.voice.audio_cache_format,
+			bitrate=config.voice.audio_bitrate,
+			telemetry=self.telemetry
+		)
+		self.resolver = Resolver(
+			workers=config.voice.resolver_workers,
+			video_ttl=config.voice.video_ttl,
+			search_ttl=config.voice.search_ttl,
+			negative_ttl=config.voice.negative_ttl
+		)
+		self.queue = Queue(self.audio_cache, bot.loop, self.telemetry, self.resolver)
 		self.formatted_time = lambda s: "%d:%02d:%02d" % (s / 3600, (s % 3600) / 60, s % 60) if s > 3600 else "%d:%02d" % (s / 60, s % 60)
+		self.is_url = lambda s: "http://" in s or "https://" in s
 		self.formatted_search = lambda res: "```" + "\n".join([f"{ix+1}: {r['title']}" for ix, r in enumerate(res)]) + "```"
 
 
@@ -186,13 +289,14 @@ class Voice(commands.Cog):
 
 	@commands.command(hidden=True, help=speech.help.leave, brief=speech.brief.leave)
 	async def leave(self, ctx, *args):
-		self.queue = Queue()
+		self.queue.cancel_timer()
+		self.queue = Queue(self.audio_cache, self.bot.loop, self.telemetry, self.resolver)
 		await ctx.voice_client.disconnect()
 
 
 	@commands.command(help=speech.help.skip, brief=speech.brief.skip)
 	async def skip(self, ctx, index=0):
-		self.queue.skip(index)
+		await self.queue.skip(index)
 		await ctx.send("Skipped song!")
 
 
@@ -209,13 +313,23 @@ class Voice(commands.Cog):
 		await ctx.send("Resumed queue!")
 
 
+	@commands.command(help=speech.help.volume, brief=speech.brief.volume)
+	async def volume(self, ctx, volume: int):
+		if not 0 <= volume <= 200:
+			raise commands.BadArgument
+
+		if self.queue.set_volume(volume / 100):
+			await ctx.send(f"Volume set to {volume}%!")
+		else:
+			await ctx.send(f"Volume set to {volume}%! It will apply from the next song.")
+
+
 	@commands.command(help=speech.help.search, brief=speech.brief.search)
 	async def search(self, ctx, *, search_term):
 		if not search_term:
 			raise commands.UserInputError()
 
-		search = VideosSearch(search_term, limit=10)
-		res = search.result()["result"]
+		res = await self.resolver.search(search_term, limit=10)
 
 		# display search message
 		send = self.formatted_search(res)
@@ -225,14 +339,15 @@ class Voice(commands.Cog):
 		for emoji in emoji_list:
 			await msg.add_reaction(emoji)
 
-		def check(reaction, user):
-			return user == ctx.message.author and reaction.emoji in emoji_list
+		# raw events, so the menu works whether or not the message is still in the message cache
+		def check(payload):
+			return payload.message_id == msg.id and payload.user_id == ctx.author.id and str(payload.emoji) in emoji_list
 
 		react = None;
 
 		try:
-			reaction, user = await self.bot.wait_for('reaction_add', timeout=60.0, check=check)
-			react = reaction.emoji
+			payload = await self.bot.wait_for('raw_reaction_add', timeout=60.0, check=check)
+			react = str(payload.emoji)
 		except asyncio.TimeoutError:
 			await ctx.channel.send(embed=discord.Embed(description="**Search timed out.**"))
 			await msg.clear_reactions()
@@ -264,7 +379,11 @@ class Voice(commands.Cog):
 				raise commands.BadArgument
 
 
-		if not ("http://" in url or "https://" in url):
+		terms = url.split()
+		if all(self.is_url(t) for t in terms) and (len(terms) > 1 or "list=" in url):
+			return await self.ingest(ctx, terms)
+
+		if not self.is_url(url):
 			search_term = url
 
 			if "-list" in search_term:
@@ -273,12 +392,13 @@ class Voice(commands.Cog):
 
 				return
 			else:
-				search = VideosSearch(search_term, limit=1)
-				watch_id = search.result()["result"][0]["id"]
+				res = await self.resolver.search(search_term, limit=1)
+				watch_id = res[0]["id"]
 
 				url = f"https://www.youtube.com/watch?v={watch_id}"
 
-		self.queue.add(url, ctx)
+		yt = await self.resolver.video(url)
+		self.queue.add(url, ctx, yt)
 
 		songs = self.queue.get_queue_songs()
 
@@ -289,12 +409,63 @@ class Voice(commands.Cog):
 			await ctx.send(embed=discord.Embed(title="Added to queue! :musical_note:", description=f"**{songs[-1].title}**\n Time until playing: {self.formatted_time(playtime)}"))
 
 
+	# queue several urls and playlists at once. metadata is resolved concurrently, but songs are queued in order
+	# as soon as they're ready so the first one starts right away. progress is reported by editing a single embed
+	async def ingest(self, ctx, urls):
+		msg = await ctx.send(embed=discord.Embed(title="Adding songs to queue... :musical_note:", description="Looking up songs..."))
+
+		videos = []
+		failed = []
+		for url in urls:
+			if "list=" in url:
+				try:
+					videos.extend(await self.resolver.playlist(url, limit=config.voice.playlist_limit))
+				except Exception as e:
+					failed.append(f"{url} ({e})")
+			else:
+				videos.append(url)
+
+		semaphore = asyncio.Semaphore(config.voice.ingest_workers)
+
+		async def resolve(url):
+			async with semaphore:
+				return await self.resolver.video(url)
+
+		tasks = [asyncio.ensure_future(resolve(url)) for url in videos]
+		added = []
+		last_edit = 0
+
+		def progress(done):
+			embed = discord.Embed(title=("Added to queue! :musical_note:" if done else "Adding songs to queue... :musical_note:"), description=f"Queued **{len(added)}/{len(videos)}** songs")
+			if added:
+				embed.add_field(name="Latest", value=added[-1], inline=False)
+			if failed:
+				embed.add_field(name=f"Failed ({len(failed)})", value="\n".join(failed[:5])[:1024], inline=False)
+			return embed
+
+		for url, task in zip(videos, tasks):
+			try:
+				yt = await task
+			except Exception as e:
+				failed.append(f"{url} ({e})")
+			else:
+				self.queue.add(url, ctx, yt)
+				added.append(yt.title)
+
+			# discord rate limits message edits, so don't edit on every song
+			if time.monotonic() - last_edit > 2:
+				last_edit = time.monotonic()
+				await msg.edit(embed=progress(False))
+
+		await msg.edit(embed=progress(True))
+
+
 	@commands.command(help=speech.help.queue, brief=speech.brief.queue)
 	async def queue(self, ctx):
 		songs = self.queue.get_queue_songs()
 
 		if songs[0].title is None:
-			return await ctx.send(f"Queue is empty! Enter a voice channel and add song with `{config.prefix}play [youtube url]`")
+			return await ctx.send(f"Queue is empty! Enter a voice channel and add song with `{ctx.prefix}play [youtube url]`")
 
 		playlist = "Up next:\n"
 		playtime = self.queue.song_time_left().total_seconds()
@@ -305,5 +476,52 @@ class Voice(commands.Cog):
 			total_playtime += song.duration
 		await ctx.send(embed=discord.Embed(title=f"Currently playing: {songs[0].title} :musical_note:\nTime remaining: {self.formatted_time(playtime)}", description=playlist))
 
+
+	@commands.is_owner()
+	@commands.command(hidden=True, help=speech.help.voicestats, brief=speech.brief.voicestats)
+	async def voicestats(self, ctx, fmt=None):
+		stats = self.telemetry.dump()
+		stats["cache"] = {"files": len(self.audio_cache), "bytes": self.audio_cache.size, "quota": self.audio_cache.quota}
+
+		if fmt == "json":
+			buf = io.BytesIO(json.dumps(stats, indent=2).encode())
+			return await ctx.send(file=discord.File(buf, "voicestats.json"))
+
+		embed = discord.Embed(title="Voice stats :musical_note:", colour=config.default_embed_colour)
+		for name, t in stats["timings"].items():
+			value = f"n={t['count']}" if not t.get("mean") else f"n={t['count']} mean={t['mean']:.2f}s p95={t['p95']:.2f}s max={t['max']:.2f}s"
+			embed.add_field(name=name, value=value, inline=False)
+
+		embed.add_field(name="Counters", value="\n".join(f"{k}: {v}" for k, v in stats["counters"].items()))
+		embed.add_field(name="Cache", value=f"{stats['cache']['files']} files, {stats['cache']['bytes'] // 1048576}/{stats['cache']['quota'] // 1048576} MB")
+		embed.add_field(name="Max RSS", value=f"{stats['max_rss_kb'] // 1024} MB")
+
+		streams = "\n".join(f"{s['guild_id']}: {s['title']} ({s['kind']}, {s['underruns']} underruns, {s['buffered_bytes'] // 1024}/{s['buffer_bytes'] // 1024} KB buffered, {s['memory_bytes'] // 1048576} MB)" for s in stats["streams"])
+		embed.add_field(name=f"Active streams ({len(stats['streams'])})", value=streams[:1024] or "None", inline=False)
+
+		await ctx.send(embed=embed)
+
+
+	# handed to the new instance when the cog is hot reloaded, so playback carries on
+	def export_state(self):
+		self.exported = True
+		return {"queue": self.queue, "resolver": self.resolver, "audio_cache": self.audio_cache, "telemetry": self.telemetry}
+
+
+	def import_state(self, state):
+		self.resolver.close()
+		self.audio_cache.close()
+		self.queue = state["queue"]
+		self.resolver = state["resolver"]
+		self.audio_cache = state["audio_cache"]
+		self.telemetry = state["telemetry"]
+
+
+	def cog_unload(self):
+		if getattr(self, "exported", False):
+			return
+		self.resolver.close()
+		self.audio_cache.close()
+
 def setup(bot):
 	bot.add_cog(Voice(bot))
\ No newline at end of file
@@ -1,18 +1,87 @@
 import re
 
-def format(args: str, flag_list: tuple, clearWhiteSpace: bool=True):
-    formatted = {}
-
-    if clearWhiteSpace:
-        args = args.replace(' ', '')
-
-    content = re.match(f"(.*?)({'|'.join(flag_list)}|$)", args)
-    if content:
-        formatted.update({'content': content.group(1)})
-
-    for flag in flag_list:
-        regex = f"(.*?){flag}(.*?)({'|'.join(flag_list)}|$)"
-        match = re.match(regex, args)
-        if match:
-            formatted.update({flag: match.group(2)})
-    return formatted
+
+class FlagError(ValueError):
+    pass
+
+
+# value converters. each takes the raw text after a flag and returns its typed value or raises FlagError
+def text(value):
+    if not value:
+        raise FlagError("needs a value")
+    return value
+
+def colour(value):
+    try:
+        if value.startswith('#'):
+            return int(value[1:], 16)
+        if value.lower().startswith('0x'):
+            return int(value[2:], 16)
+        return int(value)
+    except ValueError:
+        raise FlagError(f"expected a colour like `#ff8800` or `16746496`, got `{value}`")
+
+# a converter that accepts one of a fixed set of words, in any case
+def choice(*options):
+    def convert(value):
+        if value.lower() not in options:
+            raise FlagError(f"expected one of {', '.join(options)}, got `{value}`")
+        return value.lower()
+    return convert
+
+range_pattern = re.compile(r'\s*([a-zA-Z]+)\s*=\s*\[([^,\[\]]*),([^,\[\]]*)\]\s*')
+
+# "x=[-5, 5] a=[0, 2*pi]" -> {'x': ('-5', '5'), 'a': ('0', '2*pi')}; bounds are left as expressions
+def ranges(value):
+    found = {}
+    pos = 0
+    while pos < len(value):
+        match = range_pattern.match(value, pos)
+        if not match:
+            raise FlagError(f"could not read a range from `{value[pos:].strip()}`, expected variable=[min, max]")
+        var, low, high = match.groups()
+        if var in found:
+            raise FlagError(f"range for `{var}` given twice")
+        found[var] = (low.strip(), high.strip())
+        pos = match.end()
+    if not found:
+        raise FlagError("expected at least one variable=[min, max]")
+    return found
+
+
+# the flags a command accepts, compiled once into a single pattern. a flag only counts when it
+# stands alone, so a `-t` inside the text isn't mistaken for one. flags mapped to bool are switches
+# and take no value; anything else is a converter applied to the text up to the next flag
+class FlagGrammar:
+    def __init__(self, flags):
+        self.flags = flags
+        names = sorted(flags, key=len, reverse=True)
+        self.pattern = re.compile(r'(?:^|(?<=\s))(' + '|'.join(map(re.escape, names)) + r')(?=\s|$)')
+
+    def parse(self, args):
+        parsed = {flag: False for flag, kind in self.flags.items() if kind is bool}
+
+        matches = list(self.pattern.finditer(args))
+        end = matches[0].start() if matches else len(args)
+        parsed['content'] = args[:end].strip()
+
+        for ix, match in enumerate(matches):
+            flag = match.group(1)
+            end = matches[ix+1].start() if ix+1 < len(matches) else len(args)
+            value = args[match.end():end].strip()
+
+            if flag in parsed and parsed[flag] is not False:
+                raise FlagError(f"`{flag}` given twice")
+
+            kind = self.flags[flag]
+            if kind is bool:
+                if value:
+                    raise FlagError(f"`{flag}` doesn't take a value")
+                parsed[flag] = True
+                continue
+
+            try:
+                parsed[flag] = kind(value)
+            except FlagError as e:
+                raise FlagError(f"`{flag}` {e}")
+        return parsed
@@ -1,13 +1,35 @@
 import io
 import numpy as np
 import matplotlib.pyplot as plt
-from typing import Callable, List, Tuple
-from PIL import Image
+from typing import Callable, List, Tuple, Union
 import mathparser as mp
+import animation
 import re
 
+# expression text, or one already parsed by mathparser so it isn't parsed again for every frame
+Expr = Union[str, mp.Parsed]
+# the 2d plots also take a list of expressions, drawn together on one set of axes
+Exprs = Union[Expr, List[Expr]]
+
+
+# a single expression is named in the heading, several get a legend instead
+def label(fig, ax, exprs: List[mp.Parsed], var: str) -> None:
+	if len(exprs) == 1:
+		fig.text(0.02, 0.92, f"{var} = {exprs[0]}", fontsize=16)
+	else:
+		ax.legend()
+
+
+# draw one curve per expression, each in its own colour from the default cycle
+def plot_curves(ax, x, ys: List[List[float]], exprs: List[mp.Parsed], var: str) -> list:
+	curves = []
+	for ix, (expr, y) in enumerate(zip(exprs, ys)):
+		curves += ax.plot(x, y, color=f"C{ix}", label=f"{var} = {expr}")
+	return curves
+
+
 # plot equation on cartesian graph and return png byte array
-def static_cartesian(expr: str, x_range: Tuple[float, float]) -> io.BytesIO:
+def static_cartesian(expr: Exprs, x_range: Tuple[float, float], samples: int = None, dpi: int = None) -> io.BytesIO:
 	fig, ax = plt.subplots()
 
 	ax.grid(True, which="both")
@@ -21,21 +43,23 @@ def static_cartesian(expr: str, x_range: Tuple[float, float]) -> io.BytesIO:
 	ax.xaxis.tick_bottom()
 
 	x1, x2 = x_range
+	exprs = mp.parse_many(expr)
 
-	x = np.linspace(x1, x2, 10*int(x2-x1))
-	y = mp.eval_2d(expr, {"x": x})
+	x = np.linspace(x1, x2, samples or 10*int(x2-x1))
+	ys = mp.eval_2d_batch(exprs, {"x": x})
 
-	ax.plot(x, y)
-	fig.text(0.02, 0.92, f"y = {expr}", fontsize=16)
+	plot_curves(ax, x, ys, exprs, "y")
+	label(fig, ax, exprs, "y")
 
 	buf = io.BytesIO()
-	plt.savefig(buf, format="png")
+	plt.savefig(buf, format="png", dpi=dpi)
 
+	plt.close(fig)
 	return buf
 
 
 # plot equation on cartesian graph and return gif byte array of animating a value over specified range
-def animated_cartesian(expr: str, x_range: Tuple[float, float], a_range: Tuple[float, float]) -> io.BytesIO:
+def animated_cartesian(expr: Exprs, x_range: Tuple[float, float], a_range: Tuple[float, float], samples: int = None, frames: int = None, dpi: int = None, fmt: str = "gif") -> io.BytesIO:
 	fig, ax = plt.subplots()
 
 	ax.grid(True, which="both")
@@ -50,103 +74,109 @@ def animated_cartesian(expr: str, x_range: Tuple[float, float], a_range: Tuple[f
 
 	x1, x2 = x_range
 	a1, a2 = a_range
+	exprs = mp.parse_many(expr)
 
-	x = np.linspace(x1, x2, 10*int(x2-x1))
-	a = np.linspace(a1, a2, int(a2-a1)+1)
+	x = np.linspace(x1, x2, samples or 10*int(x2-x1))
+	a = np.linspace(a1, a2, frames or int(a2-a1)+1)
 
-	y = mp.eval_2d(expr, {"a": a2, "x": x})
+	ys = mp.eval_2d_batch(exprs, {"a": a2, "x": x})
 
 	plt.xlim(x1, x2)
-	plt.ylim(min(0, min(y)), max(y))
+	plt.ylim(min(0, min(min(y) for y in ys)), max(max(y) for y in ys))
 
 	plt.autoscale(False)
 
-	fig.text(0.02, 0.92, f"y = {expr}", fontsize=16)
+	if len(exprs) == 1:
+		label(fig, ax, exprs, "y")
 
 	frames = []
 	for a_val in a:
-		y = mp.eval_2d(expr, {"a": a_val, "x": x})
+		ys = mp.eval_2d_batch(exprs, {"a": a_val, "x": x})
 
-		curve = ax.plot(x, y)
-		plt.title(f"a = {a_val}", bbox={"facecolor": "black", "alpha": 0.75, "pad": 5}, loc="right", color="white")
+		curves = plot_curves(ax, x, ys, exprs, "y")
+		if len(exprs) > 1:
+			label(fig, ax, exprs, "y")
+		plt.title(f"a = {round(a_val, 4)}", bbox={"facecolor": "black", "alpha": 0.75, "pad": 5}, loc="right", color="white")
 
 		_buf = io.BytesIO()
-		plt.savefig(_buf, format="png")
+		plt.savefig(_buf, format="png", dpi=dpi)
 		frames.append(_buf)
 
-		curve.pop(0).remove()
+		for curve in curves:
+			curve.remove()
 
-	buf = io.BytesIO()
-	frames = [Image.open(frame) for frame in frames]
-	frames[0].save(buf, format="GIF", save_all=True, append_images=frames[1:], duration=250, loop=0)
-
-	return buf
+	plt.close(fig)
+	return animation.encode(frames, fmt, duration=250)
 
 
 # plot equation on polar graph and return png byte array
-def static_polar(expr: str, theta_range: Tuple[float, float]) -> io.BytesIO:
+def static_polar(expr: Exprs, theta_range: Tuple[float, float], samples: int = 36000, dpi: int = None) -> io.BytesIO:
 	fig, ax = plt.subplots(subplot_kw={"projection": "polar"})
 
 	ax.grid(True, which="both")
 
 	theta1, theta2 = theta_range
-	theta = np.linspace(theta1, theta2, 36000)
+	exprs = mp.parse_many(expr)
+	theta = np.linspace(theta1, theta2, samples)
 
-	r = mp.eval_2d(expr, {"theta": theta}, polar=True)
+	rs = mp.eval_2d_batch(exprs, {"theta": theta}, polar=True)
 
-	ax.plot(theta, r)
-	fig.text(0.02, 0.92, f"r = {expr}", fontsize=16)
+	plot_curves(ax, theta, rs, exprs, "r")
+	label(fig, ax, exprs, "r")
 
 	buf = io.BytesIO()
-	plt.savefig(buf, format="png")
+	plt.savefig(buf, format="png", dpi=dpi)
 
+	plt.close(fig)
 	return buf
 
 
 # plot equation on polar graph and return gif byte array of animating a value over specified range
-def animated_polar(expr: str, theta_range: Tuple[float, float], a_range: Tuple[float, float]) -> io.BytesIO:
+def animated_polar(expr: Exprs, theta_range: Tuple[float, float], a_range: Tuple[float, float], samples: int = 36000, frames: int = None, dpi: int = None, fmt: str = "gif") -> io.BytesIO:
 	fig, ax = plt.subplots(subplot_kw={"projection": "polar"})
 
 	ax.grid(True, which="both")
 
 	theta1, theta2 = theta_range
 	a1, a2 = a_range
+	exprs = mp.parse_many(expr)
 
-	theta = np.linspace(theta1, theta2, 36000)
-	a = np.linspace(a1, a2, int(a2-a1)+1)
+	theta = np.linspace(theta1, theta2, samples)
+	a = np.linspace(a1, a2, frames or int(a2-a1)+1)
 
-	r = mp.eval_2d(expr, {"a": a2, "theta": theta}, polar=True)
-	ax.set_ylim(min(0, min(r)), max(r))
+	rs = mp.eval_2d_batch(exprs, {"a": a2, "theta": theta}, polar=True)
+	ax.set_ylim(min(0, min(min(r) for r in rs)), max(max(r) for r in rs))
 
-	fig.text(0.02, 0.92, f"r = {expr}", fontsize=16)
+	if len(exprs) == 1:
+		label(fig, ax, exprs, "r")
 
 	frames = []
 	for a_val in a:
-		r = mp.eval_2d(expr, {"a": a_val, "theta": theta}, polar=True)
+		rs = mp.eval_2d_batch(exprs, {"a": a_val, "theta": theta}, polar=True)
 
-		curve = ax.plot(theta, r)
-		plt.title(f"a = {a_val}", bbox={"facecolor": "black", "alpha": 0.75, "pad": 5}, loc="right", color="white")
+		curves = plot_curves(ax, theta, rs, exprs, "r")
+		if len(exprs) > 1:
+			label(fig, ax, exprs, "r")
+		plt.title(f"a = {round(a_val, 4)}", bbox={"facecolor": "black", "alpha": 0.75, "pad": 5}, loc="right", color="white")
 
 		_buf = io.BytesIO()
-		plt.savefig(_buf, format="png")
+		plt.savefig(_buf, format="png", dpi=dpi)
 		frames.append(_buf)
 
-		curve.pop(0).remove()
+		for curve in curves:
+			curve.remove()
 
-	buf = io.BytesIO()
-	frames = [Image.open(frame) for frame in frames]
-	frames[0].save(buf, format="GIF", save_all=True, append_images=frames[1:], duration=250, loop=0)
-
-	return buf
+	plt.close(fig)
+	return animation.encode(frames, fmt, duration=250)
 
 
-def static_surface(expr: str, x_range: Tuple[float, float], y_range: Tuple[float, float]) -> io.BytesIO:
+def static_surface(expr: Expr, x_range: Tuple[float, float], y_range: Tuple[float, float], samples: int = None, dpi: int = None) -> io.BytesIO:
 	fig, ax = plt.subplots(subplot_kw={"projection": "3d"})
 
 	x1, x2 = x_range
 	y1, y2 = y_range
 
-	point_count = max(10*int(x2-x1), 10*int(y2-y1))
+	point_count = samples or max(10*int(x2-x1), 10*int(y2-y1))
 
 	x = np.linspace(x1, x2, point_count)
 	y = np.linspace(y1, y2, point_count)
@@ -161,18 +191,19 @@ def static_surface(expr: str, x_range: Tuple[float, float], y_range: Tuple[float
 	ax.plot_surface(xv, yv, z)
 
 	buf = io.BytesIO()
-	plt.savefig(buf, format="png")
+	plt.savefig(buf, format="png", dpi=dpi)
 
+	plt.close(fig)
 	return buf
 
 
-def static_surface_rotate(expr: str, x_range: Tuple[float, float], y_range: Tuple[float, float]) -> io.BytesIO:
+def static_surface_rotate(expr: Expr, x_range: Tuple[float, float], y_range: Tuple[float, float], samples: int = None, frames: int = 20, dpi: int = None, fmt: str = "gif") -> io.BytesIO:
 	fig, ax = plt.subplots(subplot_kw={"projection": "3d"})
 
 	x1, x2 = x_range
 	y1, y2 = y_range
 
-	point_count = max(10*int(x2-x1), 10*int(y2-y1))
+	point_count = samples or max(10*int(x2-x1), 10*int(y2-y1))
 
 	x = np.linspace(x1, x2, point_count)
 	y = np.linspace(y1, y2, point_count)
@@ -185,33 +216,32 @@ def static_surface_rotate(expr: str, x_range: Tuple[float, float], y_range: Tupl
 	ax.plot_surface(xv, yv, z)
 	fig.text(0.02, 0.92, f"z = {expr}", fontsize=16)
 
+	angles = np.linspace(0, 360, frames, endpoint=False)
+
 	frames = []
-	for a in range(0, 360, 18):
-		ax.view_init(30, a)
+	for angle in angles:
+		ax.view_init(30, angle)
 
 		_buf = io.BytesIO()
-		plt.savefig(_buf, format="png")
+		plt.savefig(_buf, format="png", dpi=dpi)
 		frames.append(_buf)
 
-	buf = io.BytesIO()
-	frames = [Image.open(frame) for frame in frames]
-	frames[0].save(buf, format="GIF", save_all=True, append_images=frames[1:], duration=200, loop=0)
-
-	return buf
+	plt.close(fig)
+	return animation.encode(frames, fmt, duration=200)
 
 
-def animated_surface(expr: str, x_range: Tuple[float, float], y_range: Tuple[float, float], a_range: Tuple[float, float]) -> io.BytesIO:
+def animated_surface(expr: Expr, x_range: Tuple[float, float], y_range: Tuple[float, float], a_range: Tuple[float, float], samples: int = None, frames: int = None, dpi: int = None, fmt: str = "gif") -> io.BytesIO:
 	fig, ax = plt.subplots(subplot_kw={"projection": "3d"})
 
 	x1, x2 = x_range
 	y1, y2 = y_range
 	a1, a2 = a_range
 
-	point_count = max(10*int(x2-x1), 10*int(y2-y1))
+	point_count = samples or max(10*int(x2-x1), 10*int(y2-y1))
 
 	x = np.linspace(x1, x2, point_count)
 	y = np.linspace(y1, y2, point_count)
-	a = np.linspace(a1, a2, int(a2-a1)+1)
+	a = np.linspace(a1, a2, frames or int(a2-a1)+1)
 
 	xv, yv = np.meshgrid(x, y)
 
@@ -229,33 +259,31 @@ def animated_surface(expr: str, x_range: Tuple[float, float], y_range: Tuple[flo
 		z = np.reshape(z, np.shape(xv))
 
 		surface = ax.plot_surface(xv, yv, z)
-		plt.title(f"a = {a_val}", bbox={"facecolor": "black", "alpha": 0.75, "pad": 5}, loc="right", color="white")
+		plt.title(f"a = {round(a_val, 4)}", bbox={"facecolor": "black", "alpha": 0.75, "pad": 5}, loc="right", color="white")
 
 		_buf = io.BytesIO()
-		plt.savefig(_buf, format="png")
+		plt.savefig(_buf, format="png", dpi=dpi)
 		frames.append(_buf)
 
 		surface.remove()
 
-	buf = io.BytesIO()
-	frames = [Image.open(frame) for frame in frames]
-	frames[0].save(buf, format="GIF", save_all=True, append_images=frames[1:], duration=250, loop=0)
-
-	return buf
+	plt.close(fig)
+	return animation.encode(frames, fmt, duration=250)
 
 
-def animated_surface_rotate(expr: str, x_range: Tuple[float, float], y_range: Tuple[float, float], a_range: Tuple[float, float]) -> io.BytesIO:
+def animated_surface_rotate(expr: Expr, x_range: Tuple[float, float], y_range: Tuple[float, float], a_range: Tuple[float, float], samples: int = None, frames: int = 20, dpi: int = None, fmt: str = "gif") -> io.BytesIO:
 	fig, ax = plt.subplots(subplot_kw={"projection": "3d"})
 
 	x1, x2 = x_range
 	y1, y2 = y_range
 	a1, a2 = a_range
 
-	point_count = max(10*int(x2-x1), 10*int(y2-y1))
+	point_count = samples or max(10*int(x2-x1), 10*int(y2-y1))
 
 	x = np.linspace(x1, x2, point_count)
 	y = np.linspace(y1, y2, point_count)
-	a = np.linspace(a1, a2, 60)
+	a = np.linspace(a1, a2, frames)
+	angles = np.linspace(0, 360, frames, endpoint=False)
 
 	xv, yv = np.meshgrid(x, y)
 
@@ -268,28 +296,23 @@ def animated_surface_rotate(expr: str, x_range: Tuple[float, float], y_range: Tu
 	fig.text(0.02, 0.92, f"z = {expr}", fontsize=16)
 
 	frames = []
-	for angle in range(0, 360, 18):
-		a_val = a[angle//18]
-
+	for angle, a_val in zip(angles, a):
 		z = mp.eval_3d(expr, {"x": x, "y": y, "a": a_val})
 		z = np.reshape(z, np.shape(xv))
 
 		surface = ax.plot_surface(xv, yv, z)
-		plt.title(f"a = {a_val}", bbox={"facecolor": "black", "alpha": 0.75, "pad": 5}, loc="right", color="white")
+		plt.title(f"a = {round(a_val, 4)}", bbox={"facecolor": "black", "alpha": 0.75, "pad": 5}, loc="right", color="white")
 
 		ax.view_init(30, angle)
 
 		_buf = io.BytesIO()
-		plt.savefig(_buf, format="png")
+		plt.savefig(_buf, format="png", dpi=dpi)
 		frames.append(_buf)
 
 		surface.remove()
 
-	buf = io.BytesIO()
-	frames = [Image.open(frame) for frame in frames]
-	frames[0].save(buf, format="GIF", save_all=True, append_images=frames[1:], duration=300, loop=0)
-
-	return buf
+	plt.close(fig)
+	return animation.encode(frames, fmt, duration=300)
 
 
 #remove from here down, just for testing
@@ -0,0 +1,97 @@
+import asyncio
+import time
+from pymongo.errors import PyMongoError
+from mongo import aio
+
+
+class GuildSettings:
+    __slots__ = ('prefix', 'embed_colour', 'disabled_cogs')
+    fields = {"prefix": 1, "embed_colour": 1, "disabled_cogs": 1}
+
+    def __init__(self, prefix, embed_colour, disabled_cogs=()):
+        self.prefix = prefix
+        self.embed_colour = embed_colour
+        self.disabled_cogs = frozenset(disabled_cogs)
+
+    def to_dict(self):
+        return {"prefix": self.prefix, "embed_colour": self.embed_colour, "disabled_cogs": sorted(self.disabled_cogs)}
+
+
+# per guild settings served from memory. get() never touches the database: a missing or expired
+# entry is answered from what we have (or the defaults) while a refresh is loaded in the background
+class SettingsCache:
+    def __init__(self, coll, prefix, embed_colour, ttl=600, retry_after=30):
+        self.coll = coll
+        self.defaults = GuildSettings(prefix, embed_colour)
+        self.ttl = ttl
+        self.retry_after = retry_after
+
+        self._entries = {}
+        self._loading = set()
+
+    def _from_doc(self, doc):
+        if not doc:
+            return self.defaults
+        return GuildSettings(
+            doc.get("prefix", self.defaults.prefix),
+            doc.get("embed_colour", self.defaults.embed_colour),
+            doc.get("disabled_cogs", ())
+        )
+
+    def _store(self, guild_id, settings, ttl=None):
+        self._entries[guild_id] = (time.monotonic() + (ttl or self.ttl), settings)
+
+    def get(self, guild_id):
+        entry = self._entries.get(guild_id)
+        if entry is None or entry[0] < time.monotonic():
+            if guild_id not in self._loading:
+                self._loading.add(guild_id)
+                asyncio.ensure_future(self.load(guild_id))
+            if entry is None:
+                return self.defaults
+        return entry[1]
+
+    def for_guild(self, guild):
+        return self.defaults if guild is None else self.get(guild.id)
+
+    async def load(self, guild_id):
+        try:
+            try:
+                doc = await aio.run(self.coll.find_one, {"_id": guild_id}, GuildSettings.fields)
+            except PyMongoError as e:
+                # keep what we had, even if it's stale, and try again soon rather than
+                # replacing a guild's settings with the defaults for a whole ttl
+                print(f"MongoDB find error in collection {self.coll.name}\nError:{e}")
+                entry = self._entries.get(guild_id)
+                settings = entry[1] if entry is not None else self.defaults
+                self._store(guild_id, settings, self.retry_after)
+                return settings
+
+            settings = self._from_doc(doc)
+            self._store(guild_id, settings)
+            return settings
+        finally:
+            self._loading.discard(guild_id)
+
+    # load every stored settings document in one query; guilds without one get the defaults
+    async def warm(self, guild_ids):
+        try:
+            docs = await aio.run(lambda: list(self.coll.find({"_id": {"$in": list(guild_ids)}}, GuildSettings.fields)))
+        except PyMongoError as e:
+            return print(f"MongoDB find error in collection {self.coll.name}, settings will load per guild\nError:{e}")
+
+        found = {doc["_id"]: doc for doc in docs}
+        for guild_id in guild_ids:
+            self._store(guild_id, self._from_doc(found.get(guild_id)))
+
+    def invalidate(self, guild_id):
+        self._entries.pop(guild_id, None)
+
+    # database errors are raised, so the command reports that the change wasn't saved
+    async def set(self, guild_id, **fields):
+        await aio.run(self.coll.update_one, {"_id": guild_id}, {"$set": fields}, upsert=True)
+        return await self.load(guild_id)
+
+    async def reset(self, guild_id):
+        await aio.run(self.coll.delete_one, {"_id": guild_id})
+        self.invalidate(guild_id)
@@ -0,0 +1,60 @@
+import asyncio
+import importlib
+import threading
+import time
+import types
+
+# seconds spent importing each module loaded through here, for the startup report
+import_times = {}
+modules = {}
+
+
+# stands in for a module until one of its attributes is used, then imports it for real.
+# after that the real module's namespace is copied in so later lookups don't come through __getattr__
+class LazyModule(types.ModuleType):
+    def __init__(self, name):
+        super().__init__(name)
+        self._lazy_lock = threading.Lock()
+        self._lazy_module = None
+
+    def _load(self):
+        with self._lazy_lock:
+            if self._lazy_module is None:
+                with timed(self.__name__):
+                    module = importlib.import_module(self.__name__)
+                self.__dict__.update(module.__dict__)
+                self._lazy_module = module
+        return self._lazy_module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+
+class timed:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        import_times[self.name] = time.perf_counter() - self.start
+
+
+def lazy_import(name):
+    if name not in modules:
+        modules[name] = LazyModule(name)
+    return modules[name]
+
+
+# import everything that's still lazy in a background thread, one module at a time, so first use
+# of a command doesn't pay for it. a command that gets there first just waits on that module's lock
+async def warm():
+    loop = asyncio.get_event_loop()
+    for module in list(modules.values()):
+        await loop.run_in_executor(None, module._load)
+
+
+def report(limit=10):
+    slowest = sorted(import_times.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return "\n".join(f"{seconds*1000:8.1f} ms  {name}" for name, seconds in slowest)
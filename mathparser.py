@@ -26,36 +26,69 @@ def evaluate(expr, vars={}):
 	return expr.value()
 
 
+# an expression parsed once, with its free symbols found by the parser itself.
+# str() gives back the original text, so it can be used wherever the expression string was
+class Parsed:
+	def __init__(self, text):
+		self.text = text
+		self.symbols = []
+
+		self.table = cexprtk.Symbol_Table({}, {"e": e}, add_constants=True)
+		self.table.functions["ln"] = lambda x: log(x)
+
+		self.expression = Expression(text, self.table, self._resolve)
+
+	def _resolve(self, name):
+		self.symbols.append(name)
+		return (True, cexprtk.USRSymbolType.VARIABLE, 0.0, "")
+
+	def set(self, name, value):
+		if name in self.symbols:
+			self.table.variables[name] = value
+
+	def value(self):
+		return self.expression.value()
+
+	def __str__(self):
+		return self.text
+
+
+def parse(expr):
+	return expr if isinstance(expr, Parsed) else Parsed(expr)
+
+
+# one expression or a list of them, each parsed
+def parse_many(exprs):
+	return [parse(expr) for expr in exprs] if isinstance(exprs, list) else [parse(exprs)]
+
+
 def eval_2d(expr, vars, polar=False):
-	var = "theta" if polar else "x"
+	return eval_2d_batch([expr], vars, polar)[0]
 
-	if "a" in vars.keys():
-		st = cexprtk.Symbol_Table({"a": vars["a"], var: 1}, {"e": e}, add_constants=True)
-	else:
-		st = cexprtk.Symbol_Table({var: 1}, {"e": e}, add_constants=True)
 
-	st.functions["ln"] = lambda x: log(x)
+# evaluate several expressions over the same sampling grid in a single pass, one list of values each
+def eval_2d_batch(exprs, vars, polar=False):
+	var = "theta" if polar else "x"
 
-	expr = Expression(expr, st)
+	exprs = parse_many(exprs)
+	if "a" in vars.keys():
+		for expr in exprs:
+			expr.set("a", vars["a"])
 
-	values = []
+	values = [[] for expr in exprs]
 	for val in vars[var]:
 
-		st.variables[var] = val
-		values.append(expr.value())
+		for expr, column in zip(exprs, values):
+			expr.set(var, val)
+			column.append(expr.value())
 
 	return values
 
 
 def eval_3d(expr, vars):
+	expr = parse(expr)
 	if "a" in vars.keys():
-		st = cexprtk.Symbol_Table({"a": vars["a"], "x": 1, "y": 1}, {"e": e}, add_constants=True)
-	else:
-		st = cexprtk.Symbol_Table({"x": 1, "y": 1}, {"e": e}, add_constants=True)
-
-	st.functions["ln"] = lambda x: log(x)
-
-	expr = Expression(expr, st)
+		expr.set("a", vars["a"])
 
 	x_values = vars["x"].tolist()
 	y_values = vars["y"].tolist()
@@ -66,8 +99,8 @@ def eval_3d(expr, vars):
 		vals = []
 		for y_val in y_values:
 
-			st.variables["x"] = x_val
-			st.variables["y"] = y_val
+			expr.set("x", x_val)
+			expr.set("y", y_val)
 
 			vals.append(expr.value())
 
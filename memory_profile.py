@@ -0,0 +1,109 @@
+import re
+from collections import OrderedDict
+
+import discord
+from discord.ext import commands
+
+# what the bot keeps in memory. none of the cogs read member lists or presences, and clear purges
+# from history rather than the message cache, so the minimal profile only subscribes to the events
+# the cogs handle and caches nothing else. users outside the cache are fetched when they're needed
+
+
+# guilds for the guild list and joins, messages for commands, reactions for the search menu,
+# voice states so ctx.author.voice still works without the member list
+def minimal_intents():
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.guild_messages = True
+    intents.dm_messages = True
+    intents.guild_reactions = True
+    intents.voice_states = True
+    return intents
+
+
+# keyword arguments for the bot's constructor from the memory section of config.json
+def client_options(memory):
+    intents = minimal_intents() if memory.minimal_intents else discord.Intents.default()
+    return {
+        "intents": intents,
+        # only members in voice channels are kept, which is all voice needs
+        "member_cache_flags": discord.MemberCacheFlags.from_intents(intents),
+        "chunk_guilds_at_startup": memory.chunk_guilds_at_startup,
+        "max_messages": memory.max_messages or None
+    }
+
+
+# users fetched over http because they weren't cached, kept around up to a fixed number
+class UserCache:
+    def __init__(self, size=1000):
+        self.size = size
+        self._users = OrderedDict()
+
+    def get(self, user_id):
+        user = self._users.get(user_id)
+        if user is not None:
+            self._users.move_to_end(user_id)
+        return user
+
+    def put(self, user):
+        self._users[user.id] = user
+        self._users.move_to_end(user.id)
+        while len(self._users) > self.size:
+            self._users.popitem(last=False)
+
+    def __len__(self):
+        return len(self._users)
+
+
+user_pattern = re.compile(r'<@!?([0-9]{15,21})>$|([0-9]{15,21})$')
+
+# a user argument that works without the member cache: mentions and ids go through the bot's lazy
+# lookup, anything else is left to discord.py's converter
+class LazyUser(commands.Converter):
+    async def convert(self, ctx, argument):
+        match = user_pattern.match(argument)
+        if match is None:
+            return await commands.UserConverter().convert(ctx, argument)
+
+        user = await ctx.bot.get_or_fetch_user(int(match.group(1) or match.group(2)))
+        if user is None:
+            raise commands.BadArgument(f'User "{argument}" not found')
+        return user
+
+
+# resident memory of this process, or of another one by pid
+def rss(pid="self"):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+# what's cached for each guild and overall, biggest guilds first
+def cache_report(bot):
+    guilds = [{
+        "id": guild.id,
+        "name": guild.name,
+        "members": len(guild.members),
+        "channels": len(guild.channels),
+        "roles": len(guild.roles),
+        "emojis": len(guild.emojis),
+        "voice_states": sum(len(channel.voice_states) for channel in guild.voice_channels)
+    } for guild in bot.guilds]
+    guilds.sort(key=lambda g: g["members"] + g["channels"] + g["roles"] + g["emojis"], reverse=True)
+
+    memory = rss()
+    return {
+        "guilds": len(guilds),
+        "users": len(bot.users),
+        "fetched_users": len(bot.fetched_users),
+        "messages": len(bot.cached_messages),
+        "members": sum(g["members"] for g in guilds),
+        "rss": memory,
+        "rss_per_1000_guilds": memory * 1000 // max(1, len(guilds)),
+        "per_guild": guilds
+    }
@@ -0,0 +1,180 @@
+import io
+import json
+import time
+from bisect import bisect_left
+
+from aiohttp import web
+
+# per command metrics collected through the bot's global before/after invoke hooks and served in
+# prometheus' text format on a local http endpoint. everything is kept in memory and only ever
+# grows by one series per command, so it's cheap enough to leave on
+
+latency_buckets = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+size_buckets = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 8388608)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        ix = bisect_left(self.buckets, value)
+        if ix < len(self.buckets):
+            self.counts[ix] += 1
+        self.sum += value
+        self.count += 1
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in pairs) + "}" if pairs else ""
+
+
+# one metric and its value for every combination of labels
+class Family:
+    def __init__(self, name, kind, help, buckets=None):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.buckets = buckets
+        self.values = {}
+
+    def _key(self, labels):
+        return tuple(sorted(labels.items()))
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def set(self, value, **labels):
+        self.values[self._key(labels)] = value
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        if key not in self.values:
+            self.values[key] = Histogram(self.buckets)
+        self.values[key].observe(value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in sorted(self.values.items()):
+            if self.kind != "histogram":
+                lines.append(f"{self.name}{label_text(labels)} {value}")
+                continue
+
+            # prometheus buckets are cumulative
+            total = 0
+            for bound, count in zip(value.buckets, value.counts):
+                total += count
+                lines.append(f"{self.name}_bucket{label_text(labels, [('le', bound)])} {total}")
+            lines.append(f"{self.name}_bucket{label_text(labels, [('le', '+Inf')])} {value.count}")
+            lines.append(f"{self.name}_sum{label_text(labels)} {value.sum}")
+            lines.append(f"{self.name}_count{label_text(labels)} {value.count}")
+        return lines
+
+
+# bytes in a message we send: its text, embed and files
+def payload_size(content, kwargs):
+    size = len(str(content).encode()) if content is not None else 0
+    if kwargs.get("embed") is not None:
+        size += len(json.dumps(kwargs["embed"].to_dict()))
+
+    files = kwargs.get("files") or ([kwargs["file"]] if kwargs.get("file") is not None else [])
+    for file in files:
+        if isinstance(file.fp, io.BytesIO):
+            size += file.fp.getbuffer().nbytes
+    return size
+
+
+class Metrics:
+    def __init__(self, prefix="nerdbot"):
+        self.latency = Family(f"{prefix}_command_seconds", "histogram", "Time from invoke to completion per command", latency_buckets)
+        self.request_bytes = Family(f"{prefix}_command_request_bytes", "histogram", "Size of the invoking message and its attachments", size_buckets)
+        self.response_bytes = Family(f"{prefix}_command_response_bytes", "histogram", "Bytes sent back through ctx.send per invocation", size_buckets)
+        self.invocations = Family(f"{prefix}_command_invocations_total", "counter", "Commands invoked")
+        self.errors = Family(f"{prefix}_command_errors_total", "counter", "Commands that failed, by error type")
+        self.in_flight = Family(f"{prefix}_command_in_flight", "gauge", "Commands currently running")
+        self.ws_latency = Family(f"{prefix}_websocket_latency_seconds", "gauge", "Gateway heartbeat latency per shard")
+        self.guilds = Family(f"{prefix}_guilds", "gauge", "Guilds served by this process")
+
+        self.families = [self.latency, self.request_bytes, self.response_bytes, self.invocations, self.errors, self.in_flight, self.ws_latency, self.guilds]
+        self.bot = None
+        self._runner = None
+
+    def install(self, bot):
+        self.bot = bot
+        bot.before_invoke(self.before)
+        bot.after_invoke(self.after)
+        bot.add_listener(self.on_command_error)
+
+    @staticmethod
+    def labels(ctx):
+        return {"command": ctx.command.qualified_name, "cog": ctx.cog.qualified_name if ctx.cog else "none"}
+
+    async def before(self, ctx):
+        labels = self.labels(ctx)
+        ctx.metrics_started = time.perf_counter()
+        ctx.metrics_sent = 0
+
+        self.invocations.inc(**labels)
+        self.in_flight.inc(**labels)
+        self.request_bytes.observe(len(ctx.message.content.encode()) + sum(a.size for a in ctx.message.attachments), **labels)
+
+        # count what the command sends back by wrapping this context's send
+        send = ctx.send
+        async def counted_send(content=None, **kwargs):
+            ctx.metrics_sent += payload_size(content, kwargs)
+            return await send(content, **kwargs)
+        ctx.send = counted_send
+
+    # runs after the command whether or not it raised
+    async def after(self, ctx):
+        if not hasattr(ctx, "metrics_started"):
+            return
+
+        labels = self.labels(ctx)
+        self.in_flight.inc(-1, **labels)
+        self.latency.observe(time.perf_counter() - ctx.metrics_started, **labels)
+        self.response_bytes.observe(ctx.metrics_sent, **labels)
+
+    # also sees failures from checks and argument conversion, which happen before the invoke hooks
+    async def on_command_error(self, ctx, error):
+        if ctx.command is None:
+            return
+        self.errors.inc(**self.labels(ctx), error=type(getattr(error, "original", error)).__name__)
+
+    def render(self):
+        if self.bot is not None:
+            for shard_id, latency in self.bot.latencies:
+                self.ws_latency.set(latency, shard=shard_id)
+            self.guilds.set(len(self.bot.guilds))
+
+        lines = []
+        for family in self.families:
+            lines += family.render()
+        return "\n".join(lines) + "\n"
+
+    async def handle(self, request):
+        return web.Response(text=self.render(), content_type="text/plain")
+
+    async def serve(self, host, port):
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, host, port).start()
+        except OSError as e:
+            return print(f"Metrics endpoint could not listen on {host}:{port}\nError:{e}")
+        print(f"Serving metrics on http://{host}:{port}/metrics")
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
@@ -0,0 +1,43 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pymongo.errors import PyMongoError
+
+from mongo import db as mongo
+
+# pymongo is blocking, so every call runs on a small dedicated pool instead of the event loop.
+# one thread per pooled connection; more threads would only queue up waiting for a connection
+executor = ThreadPoolExecutor(max_workers=mongo.pool_size, thread_name_prefix="mongo")
+
+
+# a PyMongoError, so callers that already handle pymongo's errors handle this one too
+class DatabaseTimeout(PyMongoError):
+    pass
+
+
+# raises DatabaseTimeout when the call takes too long, so a slow database is never mistaken for an empty result
+async def run(fn, *args, timeout=None, **kwargs):
+    loop = asyncio.get_event_loop()
+    try:
+        return await asyncio.wait_for(loop.run_in_executor(executor, partial(fn, *args, **kwargs)), timeout or mongo.timeout)
+    except asyncio.TimeoutError:
+        raise DatabaseTimeout(f"MongoDB timeout in {getattr(fn, '__name__', 'query')} after {timeout or mongo.timeout}s") from None
+
+######## CRUD ##########
+async def insert(obj, model, coll, timeout=None):
+    return await run(mongo.insert, obj, model, coll, timeout=timeout)
+
+async def bulkInsert(objs, model, coll, timeout=None):
+    return await run(mongo.bulkInsert, objs, model, coll, timeout=timeout)
+
+async def update(query, update, coll, upsert=True, timeout=None):
+    return await run(mongo.update, query, update, coll, upsert, timeout=timeout)
+
+async def remove(query, coll, timeout=None):
+    return await run(mongo.remove, query, coll, timeout=timeout)
+
+async def find(doc, coll, projection=None, timeout=None):
+    return await run(mongo.find, doc, coll, projection, timeout=timeout)
+
+def close():
+    executor.shutdown(wait=False)
@@ -0,0 +1,32 @@
+from pymongo import DESCENDING
+
+from mongo import db as mongo
+from mongo import aio
+from mongo import buffer
+
+# balance changes are gathered per user as $inc deltas and written in bulk by the users write buffer
+users = buffer.get(mongo.db.users, max_batch=1000, interval=10.0)
+
+def add(user, amount):
+    users.insert(mongo.userModel(user))
+    users.increment(user.id, {"bal": amount})
+
+# current balance including deltas that haven't been flushed yet. database errors are raised rather
+# than read as a balance of 0
+async def get(user_id):
+    doc, pending = await users.read(user_id, lambda: aio.run(mongo.db.users.find_one, {"_id": user_id}, {"bal": 1, "applied": 1}))
+    bal = doc.get("bal", 0) if doc else 0
+
+    if pending is None:
+        return bal
+    if pending.deleted:
+        bal = 0
+    if "bal" in pending.set:
+        return pending.set["bal"]
+    return bal + pending.inc.get("bal", 0)
+
+# top balances, served by the bal index. pending deltas are flushed first so the ranking is current
+async def leaderboard(limit=10):
+    await users.flush()
+    docs = await aio.run(lambda: list(mongo.db.users.find({}, {"name": 1, "bal": 1}).sort("bal", DESCENDING).limit(limit)))
+    return docs
@@ -0,0 +1,322 @@
+import asyncio
+from functools import partial
+import bson
+from bson import ObjectId
+from pymongo import UpdateOne, ReplaceOne, DeleteOne
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError, ServerSelectionTimeoutError, WaitQueueTimeoutError
+
+from mongo import aio
+
+# how many recent write tokens a document keeps. a token only has to outlive the retries of its own
+# write, and a document with an unsettled write gets no new ones until it's settled
+applied_tokens = 50
+
+# pending writes for one _id, coalesced so any number of events turns into at most one operation
+class Pending:
+    def __init__(self, _id):
+        self._id = _id
+        self.deleted = False
+        self.set_on_insert = {}
+        self.set = {}
+        self.inc = {}
+        # identifies this entry's write once it's been sent; uncertain once a send may or may not have landed
+        self.token = None
+        self.uncertain = False
+
+    def insert(self, doc):
+        self.set_on_insert.update({k: v for k, v in doc.items() if k != "_id"})
+
+    def update(self, fields):
+        for k, v in fields.items():
+            self.set[k] = v
+            self.inc.pop(k, None)
+
+    def increment(self, fields):
+        for k, v in fields.items():
+            if k in self.set:
+                self.set[k] += v
+            else:
+                self.inc[k] = self.inc.get(k, 0) + v
+
+    def delete(self):
+        self.deleted = True
+        self.set_on_insert, self.set, self.inc = {}, {}, {}
+
+    # apply the writes of a newer entry on top of this one
+    def merge(self, newer):
+        if newer.deleted:
+            self.delete()
+        self.insert(newer.set_on_insert)
+        self.update(newer.set)
+        self.increment(newer.inc)
+
+    # the write for this entry, or None when there's nothing to write
+    def operation(self):
+        query = {"_id": self._id}
+        content = self.set_on_insert or self.set or self.inc
+        if not content and not self.deleted:
+            return None
+
+        if self.deleted and not content:
+            return DeleteOne(query)
+
+        if self.deleted:
+            # the old document is gone, so whatever was written after the delete becomes the whole document
+            doc = {**self.set_on_insert, **self.set}
+            for k, v in self.inc.items():
+                doc[k] = doc.get(k, 0) + v
+            return ReplaceOne(query, doc, upsert=True)
+
+        update = {}
+        # $setOnInsert can't touch a path that $set or $inc also writes
+        set_on_insert = {k: v for k, v in self.set_on_insert.items() if k not in self.set and k not in self.inc}
+        if set_on_insert:
+            update["$setOnInsert"] = set_on_insert
+        if self.set:
+            update["$set"] = self.set
+        if self.inc:
+            # $inc isn't safe to send twice, so the document is tagged with the write's token and the
+            # write only matches a document without it. sent again after it landed, it matches nothing
+            # (or an upsert hits the duplicate key, which counts as written)
+            if self.token is None:
+                self.token = ObjectId()
+            update["$inc"] = self.inc
+            update["$push"] = {"applied": {"$each": [self.token], "$slice": -applied_tokens}}
+            query["applied"] = {"$ne": self.token}
+        return UpdateOne(query, update, upsert=bool(self.set_on_insert))
+
+    # whether this entry's write is in doc, read with the applied field
+    def applied_to(self, doc):
+        return self.token is not None and doc is not None and self.token in doc.get("applied", ())
+
+
+# write-behind buffer for one collection. writes are coalesced per _id and flushed as a single
+# unordered bulk_write once max_batch ids are pending or every interval seconds, whichever comes first
+class WriteBuffer:
+    def __init__(self, coll, max_batch=500, interval=5.0, retries=5, backoff=0.5):
+        self.coll = coll
+        self.max_batch = max_batch
+        self.interval = interval
+        self.retries = retries
+        self.backoff = backoff
+
+        self._pending = {}
+        # entries whose last write may or may not have landed, sent again as they were before anything newer for the same _id
+        self._uncertain = {}
+        self._closed = False
+        self._lock = None
+        self._task = None
+        self._full = None
+
+    def _entry(self, _id):
+        if self._task is None:
+            self._lock = asyncio.Lock()
+            self._full = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+
+        entry = self._pending.get(_id)
+        if entry is None:
+            entry = self._pending[_id] = Pending(_id)
+
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        return entry
+
+    def insert(self, doc):
+        self._entry(doc["_id"]).insert(doc)
+
+    def update(self, _id, fields):
+        self._entry(_id).update(fields)
+
+    def increment(self, _id, fields):
+        self._entry(_id).increment(fields)
+
+    def delete(self, _id):
+        self._entry(_id).delete()
+
+    def pending(self, _id):
+        return self._pending.get(_id)
+
+    def __len__(self):
+        return len(self._pending) + len(self._uncertain)
+
+    # run a database read together with a snapshot of the pending writes for _id. waits for a batch
+    # that's being written, so a write is always either in the result of the read or in the pending entry.
+    # the query should include the applied field, so an uncertain write that did land isn't counted twice
+    async def read(self, _id, query):
+        if self._lock is None:
+            return await query(), None
+
+        async with self._lock:
+            doc = await query()
+            entries = [entry for entry in (self._uncertain.get(_id), self._pending.get(_id)) if entry is not None and not entry.applied_to(doc)]
+            if not entries:
+                return doc, None
+
+            snapshot = Pending(_id)
+            for entry in entries:
+                snapshot.merge(entry)
+            return doc, snapshot
+
+    async def _run(self):
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+
+            # one bad flush mustn't stop the buffer from ever flushing again
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"MongoDB write buffer for {self.coll.name} failed to flush\nError:{e}")
+
+    # write everything pending, one batch at a time. the lock is only held while a batch is out of
+    # _pending: unwritten entries are put back before backing off, so reads never wait out the retries
+    async def flush(self):
+        if self._lock is None:
+            return
+
+        attempt = 0
+        while self._pending or self._uncertain:
+            async with self._lock:
+                batch = self._take()
+
+                try:
+                    unwritten, cancelled = await self._write(batch)
+                except Exception as e:
+                    print(f"MongoDB write buffer error in collection {self.coll.name}\nError:{e}")
+                    unwritten, cancelled = batch, False
+                self._requeue(unwritten)
+
+            if cancelled:
+                raise asyncio.CancelledError
+            if not unwritten:
+                attempt = 0
+                continue
+
+            attempt += 1
+            if attempt >= self.retries:
+                print(f"MongoDB write buffer for {self.coll.name} gave up on {len(unwritten)} writes, keeping them for the next flush")
+                return
+            await asyncio.sleep(self.backoff * 2**(attempt-1))
+
+    # the next batch. uncertain entries go first, and a pending entry waits until the uncertain one
+    # for its _id is settled, so writes to a document land in the order they were made
+    def _take(self):
+        batch = list(self._uncertain.values())[:self.max_batch]
+        for entry in batch:
+            del self._uncertain[entry._id]
+
+        blocked = set(self._uncertain) | {entry._id for entry in batch}
+        ids = [_id for _id in self._pending if _id not in blocked][:self.max_batch - len(batch)]
+        return batch + [self._pending.pop(_id) for _id in ids]
+
+    # one attempt at writing a batch. returns the entries that still need writing and whether the
+    # flush was cancelled while the write was in flight
+    async def _write(self, batch):
+        entries, ops = self._prepare(batch)
+        if not ops:
+            return [], False
+
+        future, cancelled = await self._send(ops)
+        return self._unwritten(entries, future), cancelled
+
+    # operations for a batch. entries with nothing to write, like increment(_id, {}), are left out, and
+    # ones whose values can't be stored in a document are dropped with a message rather than retried forever
+    def _prepare(self, batch):
+        entries, ops = [], []
+        for entry in batch:
+            try:
+                op = entry.operation()
+                if op is None:
+                    continue
+                bson.encode({"_id": entry._id, "fields": [entry.set_on_insert, entry.set, entry.inc]})
+            except Exception as e:
+                print(f"MongoDB write buffer in collection {self.coll.name} dropped an unwritable entry for {entry._id!r}\nError:{e}")
+                continue
+            entries.append(entry)
+            ops.append(op)
+        return entries, ops
+
+    # a write that's been handed to the executor runs to the end whether or not we wait for it, so it's
+    # always waited for, without a timeout (pymongo's socket timeout bounds it), and a cancellation
+    # is only reported once it's done
+    async def _send(self, ops):
+        future = asyncio.get_event_loop().run_in_executor(aio.executor, partial(self.coll.bulk_write, ops, ordered=False))
+        cancelled = False
+        while not future.done():
+            try:
+                await asyncio.wait([future])
+            except asyncio.CancelledError:
+                cancelled = True
+        return future, cancelled
+
+    # which entries still need writing after a bulk write finished
+    def _unwritten(self, entries, future):
+        try:
+            future.result()
+            return []
+        except BulkWriteError as e:
+            # duplicate keys mean a concurrent upsert already created the document
+            failed = {err["index"] for err in e.details.get("writeErrors", []) if err.get("code") != 11000}
+            return [entry for ix, entry in enumerate(entries) if ix in failed]
+        except (ServerSelectionTimeoutError, WaitQueueTimeoutError, OperationFailure) as e:
+            # rejected, or never sent: nothing was written
+            print(f"MongoDB write buffer error in collection {self.coll.name}\nError:{e}")
+            return entries
+        except PyMongoError as e:
+            # the connection failed mid-write, so the batch may or may not have been applied. every
+            # operation is safe to send again as it was (increments carry their token), so it's kept as is
+            print(f"MongoDB write buffer lost its connection mid-write in collection {self.coll.name}, sending it again\nError:{e}")
+            for entry in entries:
+                entry.uncertain = True
+            return entries
+        except Exception as e:
+            # failed on our side before the batch was sent, encoding it for example
+            print(f"MongoDB write buffer error in collection {self.coll.name}\nError:{e}")
+            return entries
+
+    def _requeue(self, entries):
+        for entry in entries:
+            if entry.uncertain:
+                # merging newer writes into it would lose them if it already landed
+                self._uncertain[entry._id] = entry
+                continue
+
+            newer = self._pending.get(entry._id)
+            if newer is not None:
+                entry.merge(newer)
+            self._pending[entry._id] = entry
+
+    # discord.py cancels every task on shutdown, possibly before close is called, so the background
+    # task is cancelled here too. a write it had in flight is finished and anything unwritten requeued
+    async def close(self):
+        self._closed = True
+        try:
+            if self._task is not None:
+                self._task.cancel()
+                try:
+                    await self._task
+                except asyncio.CancelledError:
+                    pass
+        finally:
+            await self.flush()
+
+
+buffers = {}
+
+# one shared buffer per collection
+def get(coll, **kwargs):
+    if coll.name not in buffers:
+        buffers[coll.name] = WriteBuffer(coll, **kwargs)
+    return buffers[coll.name]
+
+# each buffer is flushed even if another one fails
+async def close_all():
+    for buf in list(buffers.values()):
+        try:
+            await buf.close()
+        except Exception as e:
+            print(f"MongoDB write buffer for {buf.coll.name} failed to flush on close\nError:{e}")
@@ -4,11 +4,21 @@ import time
 import os
 
 import pymongo
+from pymongo import UpdateOne
 from pymongo.errors import OperationFailure, BulkWriteError, DuplicateKeyError
 from dotenv import load_dotenv
 
 load_dotenv()
-client = pymongo.MongoClient(os.getenv('MONGODB'))
+pool_size = int(os.getenv('MONGODB_POOL_SIZE', 8))
+timeout = float(os.getenv('MONGODB_TIMEOUT', 5))
+
+client = pymongo.MongoClient(
+    os.getenv('MONGODB'),
+    maxPoolSize=pool_size,
+    connectTimeoutMS=int(timeout*1000),
+    serverSelectionTimeoutMS=int(timeout*1000),
+    socketTimeoutMS=int(timeout*2000)
+)
 dev = os.getenv('DEV')
 global db
 
@@ -43,44 +53,60 @@ def simpleInsert(obj, model, coll):
     except OperationFailure as e:
         print(f"MongoDB update error in collection {coll}\nError:{e}")
 
-def insert(obj, model, coll):
-    unique = lambda d: coll.find({"_id": d.id}).count() == 0
-    r=0
+def bulkInsert(objs, model, coll):
+    # one unordered round trip; documents that already exist are left untouched
+    docs = list(map(model, objs))
+    ops = [UpdateOne({"_id": d["_id"]}, {"$setOnInsert": {k: v for k, v in d.items() if k != "_id"}}, upsert=True) for d in docs]
+    result = {"inserted": 0, "matched": 0, "failed": 0}
+    if not ops:
+        return result
+
     try:
-        if isinstance(obj, list):
-                filtered = list(filter(unique, obj))
-                if filtered:
-                    if len(filtered) < 2:
-                        r = coll.insert(model(filtered[0]))
-                    else:
-                        r = coll.insert(list(map(model, filtered)))
-        else:
-            if unique(obj):
-                r = coll.insert(model(obj))
-        return r
+        r = coll.bulk_write(ops, ordered=False)
+        details = r.bulk_api_result
+    except BulkWriteError as e:
+        details = e.details
     except OperationFailure as e:
-        print(f"MongoDB update error in collection {coll}\nError:{e}")
+        print(f"MongoDB bulk insert error in collection {coll}\nError:{e}")
+        result["failed"] = len(ops)
+        return result
+
+    # a duplicate key means a concurrent upsert got there first, which is what we wanted anyway
+    errors = details.get("writeErrors", [])
+    failures = [err for err in errors if err.get("code") != 11000]
+
+    result["inserted"] = details.get("nUpserted", 0)
+    result["matched"] = details.get("nMatched", 0) + len(errors) - len(failures)
+    result["failed"] = len(failures)
+    if failures:
+        print(f"MongoDB bulk insert error in collection {coll}\n{len(failures)} failed, first error: {failures[0].get('errmsg')}")
+    return result
+
+def insert(obj, model, coll):
+    if isinstance(obj, list):
+        return bulkInsert(obj, model, coll)
+    return bulkInsert([obj], model, coll)
 
 def update(query, update, coll, upsert=True):
     try:
         if isinstance(id, list):
-            return coll.update_many(query, update)
+            return coll.update_many(query, update, upsert=upsert)
         else:
-            return coll.update_one(query, update)
+            return coll.update_one(query, update, upsert=upsert)
     except OperationFailure as e:
         print(f"MongoDB update error in collection {coll}\nError:{e}")
 
 def remove(query, coll):
     try:
-        return coll.remove(query)
+        return coll.delete_many(query)
     except OperationFailure as e:
         return print(f"MongoDB remove error in collection {coll}\nError:{e}")
 
-def find(doc, coll):
+def find(doc, coll, projection=None):
     try:
         if isinstance(doc, list):
-            return coll.find_many(doc)
+            return list(coll.find({"$or": doc}, projection))
         else:
-            return coll.find_one(doc)
+            return coll.find_one(doc, projection)
     except OperationFailure as e:
         return print(f"MongoDB find error in collection {coll}\nError:{e}")
@@ -0,0 +1,45 @@
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+# indexes every collection needs, by name. _id is always indexed by mongo and isn't listed
+indexes = {
+    "guilds": [
+        IndexModel([("owner", ASCENDING)], name="owner"),
+        IndexModel([("joined_at", ASCENDING)], name="joined_at"),
+    ],
+    "users": [
+        IndexModel([("bal", DESCENDING)], name="bal"),
+    ],
+    "settings": [],
+}
+
+# create any declared index that doesn't exist yet; safe to run on every startup
+def ensure_indexes(db):
+    created = {}
+    for name, models in indexes.items():
+        coll = db[name]
+        try:
+            existing = set(coll.index_information().keys())
+            missing = [model for model in models if model.document["name"] not in existing]
+            if missing:
+                created[name] = coll.create_indexes(missing)
+        except OperationFailure as e:
+            print(f"MongoDB index error in collection {name}\nError:{e}")
+    return created
+
+# names of the stages in the winning query plan, e.g. ['FETCH', 'IXSCAN'], for checking a query is indexed
+def plan_stages(query, coll, projection=None, sort=None):
+    cursor = coll.find(query, projection)
+    if sort:
+        cursor = cursor.sort(sort)
+
+    plan = cursor.explain()["queryPlanner"]["winningPlan"]
+    # the slot based engine (mongo 5.1+) nests the classic plan tree under queryPlan
+    stages, pending = [], [plan.get("queryPlan", plan)]
+    while pending:
+        stage = pending.pop(0)
+        stages.append(stage["stage"])
+        if "inputStage" in stage:
+            pending.append(stage["inputStage"])
+        pending += stage.get("inputStages", [])
+    return stages
@@ -0,0 +1,282 @@
+from math import pi, isfinite
+from collections import namedtuple
+import mathparser as mp
+from lazy import lazy_import
+
+graphing = lazy_import('graphing')
+raster = lazy_import('raster')
+import animation
+
+
+class PlanError(ValueError):
+	pass
+
+
+default_ranges = {"x": (0, 10), "y": (0, 10), "theta": (0, 2*pi), "a": (0, 10)}
+
+# variables each mode may use; anything else in the expression is a mistake
+mode_symbols = {
+	"cartesian": {"x", "a"},
+	"polar": {"theta", "a"},
+	"surface": {"x", "y", "a"},
+}
+
+rotate_frames = 20
+# one per colour in the cycle, so every curve in an overlay can be told apart
+max_expressions = 10
+polar_points = 36000
+
+# rough costs measured on the bot's host, enough to tell a plot that takes a second from one that takes a minute
+seconds_per_evaluation = 4.5e-6
+seconds_per_frame = {"cartesian": 0.11, "polar": 0.2, "surface": 0.3}
+# the raster engine only draws the 2d modes
+raster_seconds_per_frame = {"cartesian": 0.02, "polar": 0.04}
+bytes_per_frame = {"static": 80000, "animated": 25000}
+
+default_dpi = 100
+figure_inches = (6.4, 4.8)
+
+# the lowest each setting is taken to when a plot has to be made cheaper
+min_samples = {"cartesian": 200, "polar": 2000, "surface": 40}
+min_frames = 8
+min_dpi = 50
+
+Cost = namedtuple("Cost", ["evaluations", "seconds", "size"])
+# what the bot needs from a plan made in a sandbox worker; the parsed expressions can't be pickled
+PlanSummary = namedtuple("PlanSummary", ["expression", "frames", "is_animation", "downgrades", "quality", "engine", "fmt"])
+
+
+# everything about a plot decided up front: the parsed expressions, which renderer to use,
+# the ranges they run over, how finely they're drawn and how much work that will take.
+# several 2d expressions share one figure and one sampling grid
+class PlotPlan:
+	def __init__(self, expressions, mode, animated, rotate, ranges, engine="matplotlib", fmt="gif"):
+		self.expressions = expressions
+		self.mode = mode
+		self.animated = animated
+		self.rotate = rotate
+		self.ranges = ranges
+		self.engine = engine if engine == "raster" and mode in raster_seconds_per_frame else "matplotlib"
+		# the format animations are encoded in; still images are always png
+		self.fmt = fmt
+
+		# mirrors how the graphing functions sample by default, but never below the floors, which
+		# a narrow range like x=[0, 0.05] or a=[0, 0.5] would otherwise take to nothing
+		span = lambda var: self.ranges[var][1] - self.ranges[var][0]
+		if mode == "cartesian":
+			self.samples = 10*int(span("x"))
+		elif mode == "polar":
+			self.samples = polar_points
+		else:
+			self.samples = max(10*int(span("x")), 10*int(span("y")))
+		self.samples = max(min_samples[mode], self.samples)
+
+		self.frames = rotate_frames if rotate else max(min_frames, int(span("a"))+1) if animated else 1
+		self.dpi = default_dpi
+		self.downgrades = []
+
+	@property
+	def expression(self):
+		return "; ".join(map(str, self.expressions))
+
+	# samples along each axis for every expression; a surface samples a square grid
+	@property
+	def points(self):
+		return len(self.expressions) * (self.samples**2 if self.mode == "surface" else self.samples)
+
+	# a rotating surface re-evaluates every frame only when it's animated too
+	@property
+	def evaluated_frames(self):
+		return 1 if self.rotate and not self.animated else self.frames
+
+	@property
+	def evaluations(self):
+		return self.points * self.evaluated_frames
+
+	@property
+	def is_animation(self):
+		return self.frames > 1
+
+	@property
+	def image_size(self):
+		return int(figure_inches[0]*self.dpi), int(figure_inches[1]*self.dpi)
+
+	@property
+	def grid(self):
+		return f"{self.samples:,}x{self.samples:,}" if self.mode == "surface" else f"{self.samples:,}"
+
+	# the settings the graphing functions need to draw exactly what was planned
+	@property
+	def quality(self):
+		return {"samples": self.samples, "frames": self.frames, "dpi": self.dpi}
+
+	@property
+	def seconds_per_frame(self):
+		return (raster_seconds_per_frame if self.engine == "raster" else seconds_per_frame)[self.mode]
+
+	def estimate(self):
+		pixels = (self.dpi / default_dpi)**2
+		seconds = self.evaluations*seconds_per_evaluation + self.frames*self.seconds_per_frame*pixels
+		size = self.frames*bytes_per_frame["animated" if self.is_animation else "static"]*pixels
+		return Cost(self.evaluations, seconds, int(size))
+
+	# whether evaluating the expression costs more time than drawing it, i.e. whether a coarser grid would help
+	def evaluation_bound(self):
+		pixels = (self.dpi / default_dpi)**2
+		return self.evaluations*seconds_per_evaluation > self.frames*self.seconds_per_frame*pixels
+
+	# lower the grid resolution, then the frame count, then the image size, halving each until the
+	# estimate is within every given limit or the setting reaches its floor. returns whether it fits
+	def fit(self, seconds=None, evaluations=None, size=None):
+		def over(grid=False):
+			cost = self.estimate()
+			if evaluations is not None and cost.evaluations > evaluations:
+				return True
+			# a coarser grid barely changes the drawing time or the file size
+			if grid and not self.evaluation_bound():
+				return False
+			return (seconds is not None and cost.seconds > seconds) or (size is not None and cost.size > size and not grid)
+
+		before = dict(self.quality, grid=self.grid, image=self.image_size)
+
+		while over(grid=True) and self.samples > min_samples[self.mode]:
+			self.samples = max(min_samples[self.mode], self.samples // 2)
+		while over() and self.is_animation and self.frames > min_frames:
+			self.frames = max(min_frames, self.frames // 2)
+		while over() and self.dpi > min_dpi:
+			self.dpi = max(min_dpi, self.dpi // 2)
+
+		if self.samples != before["samples"]:
+			self.downgrades.append(f"{'grid' if self.mode == 'surface' else 'samples'} lowered from {before['grid']} to {self.grid}")
+		if self.frames != before["frames"]:
+			self.downgrades.append(f"frames lowered from {before['frames']} to {self.frames}")
+		if self.dpi != before["dpi"]:
+			self.downgrades.append(f"image size lowered from {'x'.join(map(str, before['image']))} to {'x'.join(map(str, self.image_size))}")
+		return not over()
+
+	def summary(self):
+		return PlanSummary(self.expression, self.frames, self.is_animation, self.downgrades, self.quality, self.engine, self.fmt)
+
+	# the raster engine falls back to matplotlib for anything it can't draw.
+	# returns the image, its filename, and for animations a line on how the encoding went
+	def render(self):
+		if self.engine == "raster":
+			try:
+				return self.finish(self.draw(raster))
+			except raster.Unsupported:
+				pass
+		return self.finish(self.draw(graphing))
+
+	def finish(self, buf):
+		if isinstance(buf, animation.Animation):
+			return buf, f"anim.{buf.extension}", buf.report()
+		return buf, "image.png", None
+
+	def draw(self, engine):
+		expr = self.expressions if self.mode != "surface" else self.expressions[0]
+		r = self.ranges
+		q = self.quality
+		fmt = self.fmt
+
+		if self.mode == "polar":
+			if self.animated:
+				return engine.animated_polar(expr, r["theta"], r["a"], **q, fmt=fmt)
+			return engine.static_polar(expr, r["theta"], q["samples"], q["dpi"])
+
+		if self.mode == "surface":
+			if self.animated and self.rotate:
+				return graphing.animated_surface_rotate(expr, r["x"], r["y"], r["a"], **q, fmt=fmt)
+			if self.animated:
+				return graphing.animated_surface(expr, r["x"], r["y"], r["a"], **q, fmt=fmt)
+			if self.rotate:
+				return graphing.static_surface_rotate(expr, r["x"], r["y"], **q, fmt=fmt)
+			return graphing.static_surface(expr, r["x"], r["y"], q["samples"], q["dpi"])
+
+		if self.animated:
+			return engine.animated_cartesian(expr, r["x"], r["a"], **q, fmt=fmt)
+		return engine.static_cartesian(expr, r["x"], q["samples"], q["dpi"])
+
+
+# plan in a sandbox worker, since evaluating the range bounds runs user input. takes plan's arguments
+# and returns the plan's summary, or raises PlanError
+def plan_job(*args):
+	return plan(*args).summary()
+
+
+# plan and render in one go, for running in a sandbox worker. quality is the planning process's
+# PlotPlan.quality, passed explicitly so the worker draws what was planned.
+# returns the image bytes, a filename and the encoding report
+def render_job(expression, ranges, rotate=False, quality=None, engine="matplotlib", fmt="gif"):
+	result = plan(expression, ranges, rotate, engine=engine, fmt=fmt)
+	if quality:
+		result.samples, result.frames, result.dpi = quality["samples"], quality["frames"], quality["dpi"]
+
+	try:
+		buf, filename, report = result.render()
+	finally:
+		# pyplot keeps every figure until it's closed, and this runs in a worker that outlives the plot,
+		# so don't let one that failed halfway through drawing pile up
+		if engine == "matplotlib":
+			graphing.plt.close("all")
+	return buf.getvalue(), filename, report
+
+
+def evaluate_range(var, bounds):
+	try:
+		low, high = (mp.evaluate(bound) for bound in bounds)
+	except Exception:
+		raise PlanError(f"could not evaluate the range for {var}: [{bounds[0]}, {bounds[1]}]")
+
+	if not (isfinite(low) and isfinite(high)):
+		raise PlanError(f"the range for {var} must be finite")
+	if low >= high:
+		raise PlanError(f"the range for {var} must go from low to high")
+	return low, high
+
+
+# parse the expressions once, pick the mode from their free symbols, validate the ranges and size the job.
+# expressions separated by ; are drawn together and must all suit the same mode.
+# ranges maps variable names to unevaluated (min, max) bounds as they come from the -range flag.
+# a plot over the limits is drawn more coarsely rather than refused, unless even the coarsest is too much
+def plan(expression, ranges, rotate=False, max_evaluations=None, target_seconds=None, max_size=None, engine="matplotlib", fmt="gif"):
+	texts = [text.strip() for text in expression.split(";") if text.strip()]
+	if not texts:
+		raise PlanError("there's nothing to plot")
+	if len(texts) > max_expressions:
+		raise PlanError(f"I can only plot up to {max_expressions} expressions at once")
+
+	parsed = []
+	for text in texts:
+		try:
+			parsed.append(mp.Parsed(text))
+		except Exception as e:
+			raise PlanError(f"could not parse `{text}`: {e}")
+
+	symbols = set().union(*(p.symbols for p in parsed))
+	if "theta" in symbols and "y" in symbols:
+		raise PlanError("an expression can't use both theta and y")
+
+	mode = "polar" if "theta" in symbols else "surface" if "y" in symbols else "cartesian"
+	unknown = symbols - mode_symbols[mode]
+	if unknown:
+		raise PlanError(f"unknown variable(s) for a {mode} plot: {', '.join(sorted(unknown))}")
+	if mode == "surface" and len(parsed) > 1:
+		raise PlanError("only 2d plots can be drawn together, surfaces have to be plotted one at a time")
+
+	for var in ranges:
+		if var not in default_ranges:
+			raise PlanError(f"there's no variable {var} to give a range for")
+
+	evaluated = {var: evaluate_range(var, bounds) for var, bounds in ranges.items()}
+	needed = {"theta", "a"} if mode == "polar" else mode_symbols[mode] | {"x"}
+	for var in needed:
+		evaluated.setdefault(var, default_ranges[var])
+
+	result = PlotPlan(parsed, mode, "a" in symbols, rotate and mode == "surface", evaluated, engine, fmt)
+	result.fit(target_seconds, max_evaluations, max_size)
+
+	if max_evaluations is not None and result.evaluations > max_evaluations:
+		raise PlanError(f"that plot needs {result.evaluations:,} evaluations even at its lowest resolution, the limit is {max_evaluations:,}")
+	if max_size is not None and result.estimate().size > max_size:
+		raise PlanError("that plot would be too big to upload even at its lowest resolution. Try fewer frames")
+	return result
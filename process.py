@@ -1,19 +1,159 @@
 import json
-from collections import namedtuple
-from json import JSONEncoder
+import threading
 
 
-def readjson(file):
-    def decoder(dict):
-        return namedtuple('JSONobj', dict.keys())(*dict.values())
+# read-only attribute view over a decoded JSON object. values live in the instance __dict__, so
+# attribute lookups take python's normal fast path, and no class is created per object
+class Frozen:
+    def __init__(self, data):
+        object.__setattr__(self, '__dict__', data)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"'{name}' is read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"'{name}' is read-only")
+
+    def __getitem__(self, key):
+        return self.__dict__[key]
+
+    def __contains__(self, key):
+        return key in self.__dict__
+
+    def __iter__(self):
+        return iter(self.__dict__)
+
+    def __len__(self):
+        return len(self.__dict__)
+
+    def __repr__(self):
+        return f"Frozen({self.__dict__!r})"
+
+    # same as namedtuple's, which this replaced
+    def _asdict(self):
+        return dict(self.__dict__)
+
+
+def freeze(value):
+    if isinstance(value, dict):
+        return Frozen({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
 
+
+number = (int, float)
+
+# expected shape of each registered file. a dict describes a nested object, a type (or tuple of types) a value
+schemas = {
+    'config.json': {
+        "prefix": str,
+        "home_guild": int,
+        "log_channel": int,
+        "default_embed_colour": int,
+        "settings_ttl": number,
+        "hot_reload": bool,
+        "max_plot_evaluations": int,
+        "plot_target_seconds": number,
+        "plot_engine": str,
+        "metrics": {
+            "enabled": bool,
+            "host": str,
+            "port": int
+        },
+        "memory": {
+            "minimal_intents": bool,
+            "chunk_guilds_at_startup": bool,
+            "max_messages": int,
+            "user_cache_size": int
+        },
+        "cluster": {
+            "shards": int,
+            "processes": int,
+            "report_interval": number
+        },
+        "sandbox": {
+            "workers": int,
+            "calc_timeout": number,
+            "plot_timeout": number,
+            "memory_mb": int
+        },
+        "economy": {
+            "message_reward": int,
+            "reward_cooldown": number
+        },
+        "voice": {
+            "resolver_workers": int,
+            "video_ttl": number,
+            "search_ttl": number,
+            "negative_ttl": number,
+            "audio_cache_dir": str,
+            "audio_cache_quota_mb": number,
+            "audio_cache_format": str,
+            "audio_bitrate": int,
+            "ingest_workers": int,
+            "playlist_limit": int
+        }
+    },
+    'speech.json': {
+        "helpembed": {"helptext": str},
+        "facts": list,
+        "help": dict,
+        "brief": dict,
+        "flags": dict
+    }
+}
+
+def validate(data, schema, path=""):
+    errors = []
+    for key, expected in schema.items():
+        name = f"{path}{key}"
+        if key not in data:
+            errors.append(f"missing {name}")
+        elif isinstance(expected, dict):
+            if isinstance(data[key], dict):
+                errors.extend(validate(data[key], expected, f"{name}."))
+            else:
+                errors.append(f"{name} should be an object")
+        elif not isinstance(data[key], expected) or (isinstance(data[key], bool) and expected is not bool):
+            errors.append(f"{name} has the wrong type")
+    return errors
+
+
+registry = {}
+registry_lock = threading.Lock()
+
+def readjson(file):
     try:
         with open(file, encoding='utf8') as f:
-            t = json.load(f, object_hook=decoder)
-            return t
+            data = json.load(f)
     except FileNotFoundError:
         raise FileNotFoundError("Could not find JSON file")
 
+    errors = validate(data, schemas.get(file, {}))
+    if errors:
+        raise ValueError(f"Invalid {file}: {', '.join(errors)}")
+    return freeze(data)
+
+# shared, parsed-once view of a JSON file. every module asking for the same file gets the same object
+def loadjson(file):
+    with registry_lock:
+        if file not in registry:
+            registry[file] = readjson(file)
+        return registry[file]
+
+# re-read files into the registry, returning what they replaced. nothing changes if any file fails to load
+def reloadjson(files):
+    fresh = {file: readjson(file) for file in files}
+    with registry_lock:
+        previous = {file: registry[file] for file in files if file in registry}
+        registry.update(fresh)
+    return previous
+
+def restorejson(previous):
+    with registry_lock:
+        registry.update(previous)
+
 def colour_convert(hex):
     hex = hex.lstrip('#')
     hlen = len(hex)
@@ -0,0 +1,450 @@
+import io
+import numpy as np
+from math import floor, ceil, log10, cos, sin, radians
+from functools import lru_cache
+from typing import List, Tuple, Union
+from PIL import Image, ImageDraw, ImageFont
+import mathparser as mp
+import animation
+
+# a fast renderer for the 2d plots, drawing axes, grid, labels and curves straight onto a PIL image.
+# the layout copies matplotlib's defaults so the plots look the same as the ones graphing.py makes,
+# for a fraction of the time and memory. anything it can't draw faithfully raises Unsupported,
+# and the caller falls back to matplotlib
+
+
+# same as graphing.Expr and graphing.Exprs, which aren't imported so this doesn't pull in matplotlib
+Expr = Union[str, mp.Parsed]
+Exprs = Union[Expr, List[Expr]]
+
+
+class Unsupported(Exception):
+	pass
+
+
+figure_inches = (6.4, 4.8)
+# the axes box as fractions of the figure (left, bottom, right, top), matplotlib's subplot defaults
+axes_box = (0.125, 0.11, 0.9, 0.88)
+
+background = (255, 255, 255)
+grid_colour = (176, 176, 176)
+axis_colour = (0, 0, 0)
+# matplotlib's default colour cycle
+curve_colours = [(31, 119, 180), (255, 127, 14), (44, 160, 44), (214, 39, 40), (148, 103, 189),
+	(140, 86, 75), (227, 119, 194), (127, 127, 127), (188, 189, 34), (23, 190, 207)]
+legend_edge = (204, 204, 204)
+# matplotlib's legend frame lets curves show through it
+legend_alpha = 0.8
+# the title box is black at 75% opacity over a white figure
+title_box_colour = (64, 64, 64)
+
+# sizes in points, converted to pixels with the dpi like matplotlib does
+line_width = 1.5
+grid_width = 0.8
+tick_length = 3.5
+tick_pad = 3.5
+label_size = 10
+heading_size = 16
+title_pad = 6
+title_box_pad = 5
+# legend spacing in multiples of the label font size
+legend_pad = 0.4
+legend_handle = 2.0
+legend_handle_pad = 0.8
+legend_spacing = 0.5
+legend_margin = 0.5
+
+# curves are drawn this many times larger and scaled down, which anti-aliases them
+supersample = 3
+# how far outside the axes a point may be before it's pulled in, so huge values don't overflow the drawing
+clamp = 10
+
+
+@lru_cache(maxsize=8)
+def font(size):
+	return ImageFont.truetype("RobotoMono.ttf", size)
+
+
+class Canvas:
+	def __init__(self, dpi):
+		self.dpi = dpi or 100
+		self.width, self.height = int(figure_inches[0]*self.dpi), int(figure_inches[1]*self.dpi)
+
+		left, bottom, right, top = axes_box
+		self.left, self.right = left*self.width, right*self.width
+		self.top, self.bottom = (1-top)*self.height, (1-bottom)*self.height
+
+	def px(self, points):
+		return points*self.dpi/72
+
+	def font(self, points):
+		return font(round(self.px(points)))
+
+
+# matplotlib's tick locator in short: the smallest step of 1, 2, 2.5 or 5 times a power of ten
+# that splits the range into at most bins intervals
+def ticks(low: float, high: float, bins: int) -> Tuple[np.ndarray, float]:
+	raw = (high-low) / max(1, bins)
+	magnitude = 10**floor(log10(raw))
+
+	for multiple in (1, 2, 2.5, 5, 10):
+		step = multiple*magnitude
+		if (high-low) / step <= bins:
+			break
+
+	first = ceil(low/step - 1e-9)*step
+	values = np.arange(first, high + step*1e-9, step)
+	return values, step
+
+
+def tick_label(value: float, step: float) -> str:
+	decimals = max(0, -floor(log10(step)))
+	if round(step / 10**floor(log10(step)), 6) == 2.5:
+		decimals += 1
+
+	text = f"{value:.{decimals}f}"
+	return "0" if float(text) == 0 else text
+
+
+def bins_for(length: float, canvas: Canvas) -> int:
+	return max(1, min(9, int(length / (3*canvas.px(label_size)))))
+
+
+# widen a range that has no width, and add matplotlib's 5% margins
+def limits(low: float, high: float, margin: float = 0.05) -> Tuple[float, float]:
+	if high - low < 1e-12:
+		delta = abs(low)*0.05 or 1
+		low, high = low-delta, high+delta
+
+	pad = (high-low)*margin
+	return low-pad, high+pad
+
+
+def finite_range(values: np.ndarray) -> Tuple[float, float]:
+	finite = values[np.isfinite(values)]
+	if not len(finite):
+		raise Unsupported("nothing finite to plot")
+	return float(finite.min()), float(finite.max())
+
+
+# drop points that land on the same pixel as the one before; dense curves like the 36000 point
+# polar plots would otherwise spend most of their time joining points nobody can see
+def thin(xs: np.ndarray, ys: np.ndarray) -> List[Tuple[float, float]]:
+	pixels = np.stack((np.round(xs), np.round(ys)), axis=1)
+	keep = np.ones(len(pixels), dtype=bool)
+	keep[1:-1] = np.any(pixels[1:-1] != pixels[:-2], axis=1)
+	return list(zip(xs[keep].tolist(), ys[keep].tolist()))
+
+
+# split a curve at its gaps (nan or inf) into runs of at least two points
+def segments(xs: np.ndarray, ys: np.ndarray) -> List[List[Tuple[float, float]]]:
+	finite = np.isfinite(xs) & np.isfinite(ys)
+	runs = []
+
+	start = None
+	for ix, ok in enumerate(np.append(finite, False)):
+		if ok and start is None:
+			start = ix
+		elif not ok and start is not None:
+			if ix - start > 1:
+				runs.append(thin(xs[start:ix], ys[start:ix]))
+			start = None
+
+	return runs
+
+
+# an anti-aliased mask of the curve over a box of the given size. points are in pixels from the box's corner
+def curve_mask(size: Tuple[int, int], xs: np.ndarray, ys: np.ndarray, canvas: Canvas) -> Image.Image:
+	width, height = size
+	mask = Image.new("L", (width*supersample, height*supersample), 0)
+	draw = ImageDraw.Draw(mask)
+
+	xs = np.clip(xs, -clamp*width, (clamp+1)*width) * supersample
+	ys = np.clip(ys, -clamp*height, (clamp+1)*height) * supersample
+
+	stroke = max(1, round(canvas.px(line_width)*supersample))
+	for run in segments(xs, ys):
+		draw.line(run, fill=255, width=stroke, joint="curve")
+
+	return mask.reduce(supersample)
+
+
+def draw_heading(draw: ImageDraw.ImageDraw, canvas: Canvas, text: str) -> None:
+	# fig.text(0.02, 0.92, ...) puts the bottom left of the text at that point of the figure
+	draw.text((0.02*canvas.width, 0.08*canvas.height), text, fill=axis_colour, font=canvas.font(heading_size), anchor="ld")
+
+
+# the "a = ..." title in a dark box over the top right corner of the axes
+def draw_title(image: Image.Image, canvas: Canvas, text: str, right: float, top: float) -> None:
+	draw = ImageDraw.Draw(image)
+	label_font = canvas.font(label_size*1.2)
+
+	anchor = (right, top - canvas.px(title_pad))
+	x1, y1, x2, y2 = draw.textbbox(anchor, text, font=label_font, anchor="rd")
+	pad = canvas.px(title_box_pad)
+
+	draw.rectangle((x1-pad, y1-pad, x2+pad, y2+pad), fill=title_box_colour)
+	draw.text(anchor, text, fill=background, font=label_font, anchor="rd")
+
+
+class CartesianAxes:
+	def __init__(self, canvas: Canvas, x_limits: Tuple[float, float], y_limits: Tuple[float, float]):
+		self.canvas = canvas
+		self.x1, self.x2 = x_limits
+		self.y1, self.y2 = y_limits
+
+		self.box = (round(canvas.left), round(canvas.top), round(canvas.right), round(canvas.bottom))
+		self.origin = self.box[:2]
+		self.size = (self.box[2]-self.box[0], self.box[3]-self.box[1])
+		# the axes box clips the curves by itself
+		self.outside = None
+
+	# data to pixels, measured from the axes box's top left corner
+	def x_px(self, x):
+		return (np.asarray(x, dtype=float) - self.x1) / (self.x2-self.x1) * self.size[0]
+
+	def y_px(self, y):
+		return (self.y2 - np.asarray(y, dtype=float)) / (self.y2-self.y1) * self.size[1]
+
+	# the grid, the axes through zero with their ticks and labels, and the heading if there is one
+	def background(self, heading: str) -> Image.Image:
+		canvas = self.canvas
+		image = Image.new("RGB", (canvas.width, canvas.height), background)
+		draw = ImageDraw.Draw(image)
+		left, top, right, bottom = self.box
+
+		x_ticks, x_step = ticks(self.x1, self.x2, bins_for(self.size[0], canvas))
+		y_ticks, y_step = ticks(self.y1, self.y2, bins_for(self.size[1], canvas))
+		grid = max(1, round(canvas.px(grid_width)))
+
+		for x in left + self.x_px(x_ticks):
+			draw.line((round(x), top, round(x), bottom), fill=grid_colour, width=grid)
+		for y in top + self.y_px(y_ticks):
+			draw.line((left, round(y), right, round(y)), fill=grid_colour, width=grid)
+
+		# the spines sit on zero, or on the edge nearest it when zero is out of view
+		spine_x = round(left + float(np.clip(self.x_px(0), 0, self.size[0])))
+		spine_y = round(top + float(np.clip(self.y_px(0), 0, self.size[1])))
+		draw.line((spine_x, top, spine_x, bottom), fill=axis_colour, width=grid)
+		draw.line((left, spine_y, right, spine_y), fill=axis_colour, width=grid)
+
+		tick = canvas.px(tick_length)
+		label_font = canvas.font(label_size)
+		for value, x in zip(x_ticks, left + self.x_px(x_ticks)):
+			draw.line((round(x), spine_y, round(x), spine_y + tick), fill=axis_colour, width=grid)
+			draw.text((x, spine_y + tick + canvas.px(tick_pad)), tick_label(value, x_step), fill=axis_colour, font=label_font, anchor="mt")
+		for value, y in zip(y_ticks, top + self.y_px(y_ticks)):
+			draw.line((spine_x - tick, round(y), spine_x, round(y)), fill=axis_colour, width=grid)
+			draw.text((spine_x - tick - canvas.px(tick_pad), y), tick_label(value, y_step), fill=axis_colour, font=label_font, anchor="rm")
+
+		if heading:
+			draw_heading(draw, canvas, heading)
+		return image
+
+	def to_px(self, x, y):
+		return self.x_px(x), self.y_px(y)
+
+
+class PolarAxes:
+	def __init__(self, canvas: Canvas, r_limits: Tuple[float, float]):
+		self.canvas = canvas
+		# like matplotlib the centre is the lowest radius shown, which is only zero when nothing is negative
+		self.r_min, self.r_max = r_limits
+
+		# the polar axes is the largest circle that fits in the axes box
+		radius = min(canvas.right-canvas.left, canvas.bottom-canvas.top) / 2
+		centre = ((canvas.left+canvas.right) / 2, (canvas.top+canvas.bottom) / 2)
+
+		self.radius = round(radius)
+		self.origin = (round(centre[0]-radius), round(centre[1]-radius))
+		self.size = (2*self.radius, 2*self.radius)
+
+		# curves are clipped to the circle by blanking their mask outside it
+		outside = Image.new("L", self.size, 255)
+		ImageDraw.Draw(outside).ellipse((0, 0, self.size[0]-1, self.size[1]-1), fill=0)
+		self.outside = outside
+
+	# polar data to pixels, measured from the top left corner of the circle's bounding box
+	def to_px(self, theta, r):
+		theta, r = np.asarray(theta, dtype=float), np.asarray(r, dtype=float)
+		scale = (r - self.r_min) / (self.r_max - self.r_min) * self.radius
+		return self.radius + scale*np.cos(theta), self.radius - scale*np.sin(theta)
+
+	def background(self, heading: str) -> Image.Image:
+		canvas = self.canvas
+		image = Image.new("RGB", (canvas.width, canvas.height), background)
+		draw = ImageDraw.Draw(image)
+
+		cx, cy = self.origin[0]+self.radius, self.origin[1]+self.radius
+		grid = max(1, round(canvas.px(grid_width)))
+		label_font = canvas.font(label_size)
+
+		r_ticks, r_step = ticks(self.r_min, self.r_max, bins_for(2*self.radius, canvas))
+		for value in r_ticks:
+			pixels = (value - self.r_min) / (self.r_max - self.r_min) * self.radius
+			if pixels < 1:
+				continue
+
+			draw.ellipse((cx-pixels, cy-pixels, cx+pixels, cy+pixels), outline=grid_colour, width=grid)
+
+			# radial labels run along the 22.5 degree line
+			angle = radians(22.5)
+			draw.text((cx + pixels*cos(angle), cy - pixels*sin(angle)), tick_label(value, r_step), fill=axis_colour, font=label_font, anchor="lm")
+
+		for degrees in range(0, 360, 45):
+			angle = radians(degrees)
+			draw.line((cx, cy, cx + self.radius*cos(angle), cy - self.radius*sin(angle)), fill=grid_colour, width=grid)
+
+			distance = self.radius + canvas.px(tick_pad) + canvas.px(label_size)
+			draw.text((cx + distance*cos(angle), cy - distance*sin(angle)), f"{degrees}°", fill=axis_colour, font=label_font, anchor="mm")
+
+		draw.ellipse((cx-self.radius, cy-self.radius, cx+self.radius, cy+self.radius), outline=axis_colour, width=grid)
+		if heading:
+			draw_heading(draw, canvas, heading)
+		return image
+
+
+# the legend goes in whichever corner of the axes it covers the least of the curves in,
+# preferring the corners in matplotlib's order when it's a tie
+def draw_legend(image: Image.Image, axes, labels: List[str], coverage: np.ndarray) -> None:
+	canvas = axes.canvas
+	draw = ImageDraw.Draw(image)
+	label_font = canvas.font(label_size)
+	em = canvas.px(label_size)
+
+	text_width = max(draw.textlength(label, font=label_font) for label in labels)
+	width = round((2*legend_pad + legend_handle + legend_handle_pad)*em + text_width)
+	height = round((2*legend_pad + len(labels) + legend_spacing*(len(labels)-1))*em)
+
+	# matplotlib's "best" candidates in its order: the corners, then the middle of each edge, then the centre.
+	# the one covering the least of the curves wins, the earliest on a tie
+	margin = round(legend_margin*em)
+	left, centre_x, right = margin, (axes.size[0]-width) // 2, axes.size[0]-margin-width
+	top, centre_y, bottom = margin, (axes.size[1]-height) // 2, axes.size[1]-margin-height
+	candidates = [(right, top), (left, top), (left, bottom), (right, bottom), (right, centre_y), (left, centre_y),
+		(centre_x, bottom), (centre_x, top), (centre_x, centre_y)]
+	x, y = min(candidates, key=lambda spot: coverage[spot[1]:spot[1]+height, spot[0]:spot[0]+width].sum())
+
+	x, y = x + axes.origin[0], y + axes.origin[1]
+	box = (x, y, x+width+1, y+height+1)
+	region = image.crop(box)
+	image.paste(Image.blend(region, Image.new(image.mode, region.size, background), legend_alpha), box[:2])
+	draw.rectangle((x, y, x+width, y+height), outline=legend_edge)
+
+	stroke = max(1, round(canvas.px(line_width)))
+	for ix, label in enumerate(labels):
+		middle = y + (legend_pad + 0.5 + ix*(1+legend_spacing))*em
+		start = x + legend_pad*em
+		draw.line((start, middle, start + legend_handle*em, middle), fill=curve_colours[ix % len(curve_colours)], width=stroke)
+		draw.text((start + (legend_handle+legend_handle_pad)*em, middle), label, fill=axis_colour, font=label_font, anchor="lm")
+
+
+# draw one curve per expression in the colour cycle, with a legend when there's more than one
+def draw_curves(image: Image.Image, axes, grid: np.ndarray, values: np.ndarray, labels: List[str]) -> None:
+	masks = []
+	for ix, row in enumerate(values):
+		xs, ys = axes.to_px(grid, row)
+		mask = curve_mask(axes.size, xs, ys, axes.canvas)
+		if axes.outside is not None:
+			mask.paste(0, (0, 0), axes.outside)
+
+		image.paste(curve_colours[ix % len(curve_colours)], axes.origin, mask)
+		masks.append(np.asarray(mask))
+
+	if len(labels) > 1:
+		draw_legend(image, axes, labels, np.maximum.reduce(masks))
+
+
+def save_png(image: Image.Image) -> io.BytesIO:
+	buf = io.BytesIO()
+	image.save(buf, format="PNG")
+	return buf
+
+
+# matplotlib keeps zero as the centre unless there are negative radii, and pads the outside by 5%
+def polar_limits(r: np.ndarray) -> Tuple[float, float]:
+	low, high = finite_range(r)
+	padded = limits(low, high)
+	return (padded[0] if low < 0 else 0), padded[1]
+
+
+def static_cartesian(expr: Exprs, x_range: Tuple[float, float], samples: int = None, dpi: int = None) -> io.BytesIO:
+	x1, x2 = x_range
+	exprs = mp.parse_many(expr)
+
+	x = np.linspace(x1, x2, samples or 10*int(x2-x1))
+	ys = np.array(mp.eval_2d_batch(exprs, {"x": x}), dtype=float)
+
+	axes = CartesianAxes(Canvas(dpi), limits(x1, x2), limits(*finite_range(ys)))
+	labels = [f"y = {expr}" for expr in exprs]
+
+	image = axes.background(labels[0] if len(exprs) == 1 else None)
+	draw_curves(image, axes, x, ys, labels)
+	return save_png(image)
+
+
+def animated_cartesian(expr: Exprs, x_range: Tuple[float, float], a_range: Tuple[float, float], samples: int = None, frames: int = None, dpi: int = None, fmt: str = "gif") -> io.BytesIO:
+	x1, x2 = x_range
+	a1, a2 = a_range
+	exprs = mp.parse_many(expr)
+
+	x = np.linspace(x1, x2, samples or 10*int(x2-x1))
+	a = np.linspace(a1, a2, frames or int(a2-a1)+1)
+
+	# the y limits come from the last frame, like the matplotlib version
+	low, high = finite_range(np.array(mp.eval_2d_batch(exprs, {"a": a2, "x": x}), dtype=float))
+	axes = CartesianAxes(Canvas(dpi), (x1, x2), limits(min(0, low), high, margin=0))
+	labels = [f"y = {expr}" for expr in exprs]
+
+	base = axes.background(labels[0] if len(exprs) == 1 else None)
+	images = []
+	for a_val in a:
+		ys = np.array(mp.eval_2d_batch(exprs, {"a": a_val, "x": x}), dtype=float)
+
+		image = base.copy()
+		draw_curves(image, axes, x, ys, labels)
+		draw_title(image, axes.canvas, f"a = {round(a_val, 4)}", axes.box[2], axes.box[1])
+		images.append(image)
+
+	return animation.encode(images, fmt, duration=250)
+
+
+def static_polar(expr: Exprs, theta_range: Tuple[float, float], samples: int = 36000, dpi: int = None) -> io.BytesIO:
+	theta1, theta2 = theta_range
+	exprs = mp.parse_many(expr)
+
+	theta = np.linspace(theta1, theta2, samples)
+	rs = np.array(mp.eval_2d_batch(exprs, {"theta": theta}, polar=True), dtype=float)
+
+	axes = PolarAxes(Canvas(dpi), polar_limits(rs))
+	labels = [f"r = {expr}" for expr in exprs]
+
+	image = axes.background(labels[0] if len(exprs) == 1 else None)
+	draw_curves(image, axes, theta, rs, labels)
+	return save_png(image)
+
+
+def animated_polar(expr: Exprs, theta_range: Tuple[float, float], a_range: Tuple[float, float], samples: int = 36000, frames: int = None, dpi: int = None, fmt: str = "gif") -> io.BytesIO:
+	theta1, theta2 = theta_range
+	a1, a2 = a_range
+	exprs = mp.parse_many(expr)
+
+	theta = np.linspace(theta1, theta2, samples)
+	a = np.linspace(a1, a2, frames or int(a2-a1)+1)
+
+	# the radius limits come from the last frame, like the matplotlib version
+	low, high = finite_range(np.array(mp.eval_2d_batch(exprs, {"a": a2, "theta": theta}, polar=True), dtype=float))
+	axes = PolarAxes(Canvas(dpi), limits(min(0, low), high, margin=0))
+	labels = [f"r = {expr}" for expr in exprs]
+
+	base = axes.background(labels[0] if len(exprs) == 1 else None)
+	images = []
+	for a_val in a:
+		rs = np.array(mp.eval_2d_batch(exprs, {"a": a_val, "theta": theta}, polar=True), dtype=float)
+
+		image = base.copy()
+		draw_curves(image, axes, theta, rs, labels)
+		draw_title(image, axes.canvas, f"a = {round(a_val, 4)}", axes.canvas.right, axes.canvas.top)
+		images.append(image)
+
+	return animation.encode(images, fmt, duration=250)
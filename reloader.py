@@ -0,0 +1,74 @@
+import asyncio
+import os
+from watchgod import awatch, AllWatcher, Change
+import process
+
+
+# only look at the bot's own code and json files, not the audio cache or anything else in the tree
+class SourceWatcher(AllWatcher):
+    def should_watch_dir(self, entry):
+        return entry.name == 'cogs'
+
+    def should_watch_file(self, entry):
+        return entry.name.endswith(('.py', '.json'))
+
+
+# reloads json files and cogs when they change on disk, without restarting the bot.
+# cogs can keep long lived state (voice queues, caches) across a reload by defining export_state()
+# and import_state(state). a reload either applies completely or is rolled back to what was running
+class Reloader:
+    def __init__(self, bot, path='.'):
+        self.bot = bot
+        self.path = path
+        self.lock = asyncio.Lock()
+
+    async def run(self):
+        async for changes in awatch(self.path, watcher_cls=SourceWatcher):
+            files = {os.path.relpath(path, self.path) for change, path in changes if change != Change.deleted}
+            try:
+                await self.reload(files)
+            except Exception as e:
+                print(f"Reload failed, kept the running version\nError: {e}")
+
+    async def reload(self, files):
+        async with self.lock:
+            json_files = [file for file in files if file in process.registry]
+            extensions = [f"cogs.{os.path.basename(file)[:-3]}" for file in files if os.path.dirname(file) == 'cogs' and file.endswith('.py')]
+
+            # every cog reads config and speech at import, so new json means reloading all of them
+            if json_files:
+                extensions = list(self.bot.extensions)
+            extensions = [ext for ext in extensions if ext in self.bot.extensions]
+
+            if not extensions:
+                return
+
+            # parses and validates everything before anything is swapped, so a bad file changes nothing
+            previous = process.reloadjson(json_files) if json_files else {}
+
+            done = []
+            try:
+                for ext in extensions:
+                    self.reload_extension(ext)
+                    done.append(ext)
+            except Exception:
+                process.restorejson(previous)
+                for ext in done:
+                    self.reload_extension(ext)
+                raise
+
+            print(f"Reloaded {', '.join(json_files + extensions)}")
+
+    # reload_extension already puts the old module back if the new one fails to load,
+    # either way the cog that ends up loaded gets the exported state
+    def reload_extension(self, ext):
+        cogs = [cog for cog in self.bot.cogs.values() if cog.__module__ == ext]
+        state = {cog.qualified_name: cog.export_state() for cog in cogs if hasattr(cog, 'export_state')}
+
+        try:
+            self.bot.reload_extension(ext)
+        finally:
+            for name, value in state.items():
+                cog = self.bot.get_cog(name)
+                if cog is not None:
+                    cog.import_state(value)
@@ -0,0 +1,145 @@
+import asyncio
+import multiprocessing
+import os
+import resource
+import signal
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SandboxError(Exception):
+	pass
+
+
+class SandboxTimeout(SandboxError):
+	pass
+
+
+def virtual_memory():
+	try:
+		with open("/proc/self/status") as f:
+			for line in f:
+				if line.startswith("VmSize:"):
+					return int(line.split()[1]) * 1024
+	except OSError:
+		pass
+	return 0
+
+
+# runs in the worker process. forked workers start with a copy of the bot, so the address space limit
+# is what's already mapped plus the budget, and every inherited file descriptor (sockets included) is closed
+def serve(conn, memory):
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+	signal.signal(signal.SIGTERM, signal.SIG_DFL)
+	signal.set_wakeup_fd(-1)
+
+	fd = conn.fileno()
+	os.closerange(3, fd)
+	os.closerange(fd+1, os.sysconf("SC_OPEN_MAX"))
+
+	limit = virtual_memory() + memory
+	resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+	while True:
+		try:
+			fn, args = conn.recv()
+		except EOFError:
+			return
+
+		try:
+			result = (True, fn(*args))
+		except BaseException as e:
+			result = (False, e)
+
+		try:
+			conn.send(result)
+		except Exception as e:
+			# the result or exception couldn't be pickled
+			conn.send((False, SandboxError(f"{type(result[1]).__name__}: {result[1]}")))
+
+
+class Worker:
+	def __init__(self, context, memory):
+		self.conn, child = context.Pipe()
+		self.process = context.Process(target=serve, args=(child, memory), daemon=True)
+		self.process.start()
+		child.close()
+
+	@property
+	def alive(self):
+		return self.process.is_alive()
+
+	# blocking; called from the sandbox's thread pool
+	def call(self, fn, args, timeout):
+		self.conn.send((fn, args))
+
+		if not self.conn.poll(timeout):
+			self.kill()
+			raise SandboxTimeout(f"took longer than {timeout:g}s")
+
+		try:
+			ok, value = self.conn.recv()
+		except EOFError:
+			self.kill()
+			raise SandboxError("the worker died, most likely from running out of memory")
+
+		if ok:
+			return value
+		if isinstance(value, MemoryError):
+			# whatever it was doing may have left the worker bloated, start a fresh one
+			self.kill()
+			raise SandboxError("ran out of memory")
+		raise value
+
+	def kill(self):
+		if self.process.is_alive():
+			self.process.kill()
+		self.process.join()
+		self.conn.close()
+
+
+# a small pool of reusable worker processes for running untrusted expressions. each job gets a
+# wall clock timeout, each worker a memory budget, and a worker that overruns is killed and replaced
+class Sandbox:
+	def __init__(self, workers=2, timeout=10, memory_mb=512):
+		self.timeout = timeout
+		self.memory = memory_mb * 1024 * 1024
+
+		# fork so workers don't re-import bot.py, which would start another bot
+		self._context = multiprocessing.get_context("fork")
+		self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sandbox")
+		self._workers = [Worker(self._context, self.memory) for _ in range(workers)]
+		self._idle = None
+
+	async def run(self, fn, *args, timeout=None):
+		if self._idle is None:
+			self._idle = asyncio.Queue()
+			for worker in self._workers:
+				self._idle.put_nowait(worker)
+
+		worker = await self._idle.get()
+		loop = asyncio.get_event_loop()
+
+		# the worker goes back to the pool when its call is done, not when we stop waiting for it. a cancelled
+		# caller would otherwise hand it to the next job while this one is still using its pipe
+		def done(future):
+			try:
+				loop.call_soon_threadsafe(self._release, worker)
+			except RuntimeError:
+				# the loop has closed, nothing is waiting for a worker any more
+				pass
+
+		future = self._executor.submit(worker.call, fn, args, timeout or self.timeout)
+		future.add_done_callback(done)
+		return await asyncio.wrap_future(future)
+
+	def _release(self, worker):
+		if not worker.alive:
+			self._workers.remove(worker)
+			worker = Worker(self._context, self.memory)
+			self._workers.append(worker)
+		self._idle.put_nowait(worker)
+
+	def close(self):
+		for worker in self._workers:
+			worker.kill()
+		self._executor.shutdown(wait=False)
@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+from pymongo import ReplaceOne, DeleteOne
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+# mongo.db imports discord
+pytest.importorskip("discord")
+from mongo import buffer
+
+# the write buffer against an in-memory collection that understands the operations the buffer sends,
+# and can drop the connection just before or just after a write lands
+
+
+class FakeColl:
+    name = "users"
+
+    def __init__(self):
+        self.docs = {}
+        self.fail = None
+
+    def matches(self, doc, query):
+        for k, v in query.items():
+            if isinstance(v, dict) and "$ne" in v:
+                if v["$ne"] in doc.get(k, []):
+                    return False
+            elif doc.get(k) != v:
+                return False
+        return True
+
+    # returns whether the operation hit a duplicate key
+    def apply(self, op):
+        query, update = op._filter, getattr(op, "_doc", None)
+        _id = query["_id"]
+        if isinstance(op, DeleteOne):
+            self.docs.pop(_id, None)
+            return False
+        if isinstance(op, ReplaceOne):
+            self.docs[_id] = {"_id": _id, **update}
+            return False
+
+        doc = self.docs.get(_id)
+        if doc is not None and not self.matches(doc, query):
+            return op._upsert
+        if doc is None:
+            if not op._upsert:
+                return False
+            doc = self.docs[_id] = {"_id": _id, **update.get("$setOnInsert", {})}
+
+        doc.update(update.get("$set", {}))
+        for k, v in update.get("$inc", {}).items():
+            doc[k] = doc.get(k, 0) + v
+        for k, v in update.get("$push", {}).items():
+            doc[k] = (doc.get(k, []) + v["$each"])[v["$slice"]:]
+        return False
+
+    def bulk_write(self, ops, ordered=True):
+        fail, self.fail = self.fail, None
+        if fail == "before":
+            raise AutoReconnect("connection reset")
+
+        duplicates = [ix for ix, op in enumerate(ops) if self.apply(op)]
+        if fail == "after":
+            raise AutoReconnect("connection reset")
+        if duplicates:
+            raise BulkWriteError({"writeErrors": [{"index": ix, "code": 11000} for ix in duplicates]})
+
+    def find_one(self, query, projection=None):
+        return self.docs.get(query["_id"])
+
+
+def reward(buf, user_id, amount):
+    buf.insert({"_id": user_id, "name": "user", "bal": 0})
+    buf.increment(user_id, {"bal": amount})
+
+
+async def balance(buf, coll, user_id):
+    async def query():
+        return coll.find_one({"_id": user_id})
+
+    doc, pending = await buf.read(user_id, query)
+    bal = doc.get("bal", 0) if doc else 0
+    return bal + (pending.inc.get("bal", 0) if pending else 0)
+
+
+@pytest.mark.parametrize("when", ["before", "after"])
+def test_increment_survives_lost_connection(when):
+    async def run():
+        coll = FakeColl()
+        buf = buffer.WriteBuffer(coll, interval=60, backoff=0)
+        reward(buf, 1, 5)
+        coll.fail = when
+        await buf.flush()
+        await buf.close()
+        return coll.docs[1]["bal"]
+
+    assert asyncio.run(run()) == 5
+
+
+@pytest.mark.parametrize("when", ["before", "after"])
+def test_newer_increments_wait_for_uncertain_write(when):
+    async def run():
+        coll = FakeColl()
+        buf = buffer.WriteBuffer(coll, interval=60, retries=1, backoff=0)
+        reward(buf, 1, 5)
+        coll.docs[1] = {"_id": 1, "bal": 10}
+        coll.fail = when
+        # gives up after one attempt, leaving the write unsettled
+        await buf.flush()
+
+        reward(buf, 1, 3)
+        seen = await balance(buf, coll, 1)
+        await buf.flush()
+        await buf.close()
+        return seen, coll.docs[1]["bal"]
+
+    assert asyncio.run(run()) == (18, 18)
+
+
+def test_unwritable_entries_are_dropped_and_the_rest_written():
+    async def run():
+        coll = FakeColl()
+        buf = buffer.WriteBuffer(coll, interval=60)
+        reward(buf, 1, 5)
+        buf.update(2, {"name": object()})
+        buf.increment(3, {})
+        await buf.close()
+        return coll.docs, len(buf)
+
+    docs, left = asyncio.run(run())
+    assert docs[1]["bal"] == 5
+    assert 2 not in docs and 3 not in docs
+    assert left == 0
@@ -0,0 +1,83 @@
+import os
+
+import pytest
+from pymongo import MongoClient, DESCENDING
+from pymongo.errors import PyMongoError
+
+from mongo import schema
+
+# query plan checks run against a local mongod (MONGODB_TEST, or localhost by default) in a throwaway
+# database, and are skipped when there isn't one. the plan_stages parsing tests need no server
+
+
+class FakeCursor:
+    def __init__(self, plan):
+        self.plan = plan
+
+    def sort(self, sort):
+        return self
+
+    def explain(self):
+        return {"queryPlanner": {"winningPlan": self.plan}}
+
+
+class FakeColl:
+    def __init__(self, plan):
+        self.plan = plan
+
+    def find(self, query, projection=None):
+        return FakeCursor(self.plan)
+
+
+def test_plan_stages_classic():
+    plan = {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "owner"}}
+    assert schema.plan_stages({"owner": 1}, FakeColl(plan)) == ["FETCH", "IXSCAN"]
+
+
+def test_plan_stages_sbe():
+    plan = {"queryPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}, "slotBasedPlan": {"stages": "..."}}
+    assert schema.plan_stages({"owner": 1}, FakeColl(plan)) == ["FETCH", "IXSCAN"]
+
+
+def test_plan_stages_multiple_inputs():
+    plan = {"stage": "SUBPLAN", "inputStage": {"stage": "OR", "inputStages": [{"stage": "IXSCAN"}, {"stage": "COLLSCAN"}]}}
+    assert schema.plan_stages({}, FakeColl(plan)) == ["SUBPLAN", "OR", "IXSCAN", "COLLSCAN"]
+
+
+@pytest.fixture(scope="module")
+def db():
+    client = MongoClient(os.getenv("MONGODB_TEST", "mongodb://localhost:27017"), serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        pytest.skip("no mongod reachable")
+
+    db = client["nerdbot_schema_test"]
+    client.drop_database(db.name)
+    db.guilds.insert_many([{"_id": ix, "owner": ix % 50, "joined_at": f"2021-01-{1 + ix % 28:02d}"} for ix in range(500)])
+    db.users.insert_many([{"_id": ix, "name": f"user{ix}", "bal": ix % 97} for ix in range(500)])
+    schema.ensure_indexes(db)
+
+    yield db
+    client.drop_database(db.name)
+    client.close()
+
+
+def assert_indexed(stages):
+    assert "IXSCAN" in stages
+    assert "COLLSCAN" not in stages
+
+
+def test_owner_lookup_uses_index(db):
+    assert_indexed(schema.plan_stages({"owner": 7}, db.guilds, {"_id": 1}))
+
+
+def test_joined_at_lookup_uses_index(db):
+    assert_indexed(schema.plan_stages({"joined_at": {"$gte": "2021-01-20"}}, db.guilds))
+
+
+def test_leaderboard_uses_index(db):
+    stages = schema.plan_stages({}, db.users, {"name": 1, "bal": 1}, [("bal", DESCENDING)])
+    assert_indexed(stages)
+    # served in index order, without sorting in memory
+    assert "SORT" not in stages
@@ -0,0 +1,183 @@
+import fcntl
+import resource
+import struct
+import termios
+import time
+from collections import deque
+from contextlib import contextmanager
+import discord
+from memory_profile import rss
+
+
+FRAME_SECONDS = 0.02
+# how often the ffmpeg pipe is polled for its fill level, in frames
+PIPE_POLL_FRAMES = 50
+F_GETPIPE_SZ = getattr(fcntl, "F_GETPIPE_SZ", 1032)
+
+
+# bytes ffmpeg has written to the pipe that the player hasn't read yet, and how much the pipe holds
+def pipe_fill(pipe):
+	try:
+		fd = pipe.fileno()
+		pending = struct.unpack("i", fcntl.ioctl(fd, termios.FIONREAD, b"\0\0\0\0"))[0]
+		return pending, fcntl.fcntl(fd, F_GETPIPE_SZ)
+	except (OSError, ValueError):
+		return None
+
+
+# rolling window of samples for one measurement
+class Stat:
+	def __init__(self, window=1000):
+		self.count = 0
+		self.total = 0.0
+		self._samples = deque(maxlen=window)
+
+	def add(self, value):
+		self.count += 1
+		self.total += value
+		self._samples.append(value)
+
+	def summary(self):
+		samples = sorted(self._samples)
+		if not samples:
+			return {"count": 0}
+
+		pick = lambda q: samples[min(len(samples)-1, int(q * len(samples)))]
+		return {
+			"count": self.count,
+			"mean": self.total / self.count,
+			"p50": pick(0.5),
+			"p95": pick(0.95),
+			"max": samples[-1]
+		}
+
+
+# per guild bookkeeping for the stream currently being played
+class StreamStats:
+	def __init__(self, guild_id, title, kind):
+		self.guild_id = guild_id
+		self.title = title
+		self.kind = kind
+		self.started = time.monotonic()
+		self.first_frame = None
+		self.frames = 0
+		self.underruns = 0
+		self.buffered = 0
+		self.buffer_size = 0
+		self.pid = None
+
+	# memory held for this guild: the ffmpeg child's resident set while it runs, plus the decoded
+	# audio when the whole song was read into a pcm buffer
+	def memory(self):
+		memory = rss(self.pid) if self.pid is not None else 0
+		if self.kind == "pcm":
+			memory += self.buffer_size
+		return memory
+
+	def to_dict(self):
+		return {
+			"guild_id": self.guild_id,
+			"title": self.title,
+			"kind": self.kind,
+			"age": time.monotonic() - self.started,
+			"frames": self.frames,
+			"underruns": self.underruns,
+			"buffered_bytes": self.buffered,
+			"buffer_bytes": self.buffer_size,
+			"memory_bytes": self.memory()
+		}
+
+
+class VoiceTelemetry:
+	def __init__(self, window=1000):
+		self.window = window
+		self.timings = {}
+		self.counters = {"streams": 0, "frames": 0, "underruns": 0, "truncated": 0}
+		self.streams = {}
+
+	def record(self, name, seconds):
+		if name not in self.timings:
+			self.timings[name] = Stat(self.window)
+		self.timings[name].add(seconds)
+
+	@contextmanager
+	def timer(self, name):
+		start = time.monotonic()
+		try:
+			yield
+		finally:
+			self.record(name, time.monotonic() - start)
+
+	def start_stream(self, guild_id, title, kind):
+		self.counters["streams"] += 1
+		stream = StreamStats(guild_id, title, kind)
+		self.streams[guild_id] = stream
+		return stream
+
+	def end_stream(self, stream):
+		if self.streams.get(stream.guild_id) is stream:
+			del self.streams[stream.guild_id]
+
+	def dump(self):
+		return {
+			"timings": {name: stat.summary() for name, stat in self.timings.items()},
+			"counters": dict(self.counters),
+			"streams": [stream.to_dict() for stream in self.streams.values()],
+			"max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		}
+
+
+# wraps an audio source to time the first frame, count frames and spot underruns.
+# the player thread asks for a frame every 20ms, so a read slower than that is heard as a stutter
+class InstrumentedSource(discord.AudioSource):
+	def __init__(self, original, telemetry, stream, duration, requested):
+		self.original = original
+		self.telemetry = telemetry
+		self.stream = stream
+		self.duration = duration
+		self.requested = requested
+
+		# unwrap PCMVolumeTransformer to reach the ffmpeg source
+		source = getattr(original, "original", original)
+		self.buffer_fill = getattr(source, "buffer_fill", None)
+		process = getattr(source, "_process", None)
+		self.pipe = process.stdout if process is not None and self.buffer_fill is None else None
+		if process is not None and process.poll() is None:
+			stream.pid = process.pid
+
+	def is_opus(self):
+		return self.original.is_opus()
+
+	def read(self):
+		start = time.monotonic()
+		ret = self.original.read()
+		elapsed = time.monotonic() - start
+
+		stream = self.stream
+		if stream.first_frame is None:
+			stream.first_frame = time.monotonic()
+			self.telemetry.record("time_to_first_audio", stream.first_frame - self.requested)
+		elif elapsed > FRAME_SECONDS:
+			stream.underruns += 1
+			self.telemetry.counters["underruns"] += 1
+
+		if ret:
+			stream.frames += 1
+			self.telemetry.counters["frames"] += 1
+		elif stream.frames * FRAME_SECONDS < self.duration - 1:
+			# ran dry well before the end of the song
+			self.telemetry.counters["truncated"] += 1
+
+		# the pcm source's buffer is in memory and cheap to check; a live ffmpeg pipe takes a syscall, so it's polled less often
+		if self.buffer_fill is not None:
+			stream.buffered, stream.buffer_size = self.buffer_fill()
+		elif self.pipe is not None and stream.frames % PIPE_POLL_FRAMES == 1:
+			fill = pipe_fill(self.pipe)
+			if fill is not None:
+				stream.buffered, stream.buffer_size = fill
+
+		return ret
+
+	def cleanup(self):
+		self.telemetry.end_stream(self.stream)
+		self.original.cleanup()
@@ -0,0 +1,145 @@
+import asyncio
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from lazy import lazy_import
+
+pytube = lazy_import('pytube')
+youtubesearchpython = lazy_import('youtubesearchpython')
+
+
+# plain metadata snapshot of a video; attribute names match pytube's YouTube so it can be used in its place
+class VideoInfo:
+	def __init__(self, url, yt):
+		self.url = url
+		self.video_id = yt.video_id
+		self.title = yt.title
+		self.length = yt.length
+		self.thumbnail_url = yt.thumbnail_url
+
+
+# small LRU cache where each entry expires after its own ttl
+class TTLCache:
+	def __init__(self, max_size=1024):
+		self.max_size = max_size
+		self._entries = OrderedDict()
+
+	def get(self, key):
+		entry = self._entries.get(key)
+		if entry is None:
+			return None
+
+		expires, value = entry
+		if expires < time.monotonic():
+			del self._entries[key]
+			return None
+
+		self._entries.move_to_end(key)
+		return entry
+
+	def set(self, key, value, ttl):
+		self._entries[key] = (time.monotonic() + ttl, value)
+		self._entries.move_to_end(key)
+
+		while len(self._entries) > self.max_size:
+			self._entries.popitem(last=False)
+
+	def clear(self):
+		self._entries.clear()
+
+	def __len__(self):
+		return len(self._entries)
+
+
+class _Failure:
+	def __init__(self, exc):
+		self.exc = exc
+
+
+# resolves youtube metadata and searches off the event loop.
+# results are cached, failures are cached for a short while and concurrent lookups of the same key share one request
+class Resolver:
+	def __init__(self, workers=4, video_ttl=3600, search_ttl=600, negative_ttl=30, max_size=1024):
+		self.video_ttl = video_ttl
+		self.search_ttl = search_ttl
+		self.negative_ttl = negative_ttl
+
+		self._cache = TTLCache(max_size)
+		self._inflight = {}
+		self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="resolver")
+
+
+	async def _resolve(self, key, fn, ttl):
+		entry = self._cache.get(key)
+		if entry is not None:
+			value = entry[1]
+			if isinstance(value, _Failure):
+				raise value.exc
+			return value
+
+		future = self._inflight.get(key)
+		if future is None:
+			loop = asyncio.get_event_loop()
+			future = loop.run_in_executor(self._executor, fn)
+			self._inflight[key] = future
+			future.add_done_callback(lambda f: self._store(key, f, ttl))
+
+		# shield so a cancelled caller doesn't cancel the lookup for everyone else waiting on it
+		return await asyncio.shield(future)
+
+
+	def _store(self, key, future, ttl):
+		self._inflight.pop(key, None)
+
+		if future.cancelled():
+			return
+
+		exc = future.exception()
+		if exc is not None:
+			self._cache.set(key, _Failure(exc), self.negative_ttl)
+		else:
+			self._cache.set(key, future.result(), ttl)
+
+
+	async def video(self, url):
+		try:
+			key = ("video", pytube.extract.video_id(url))
+		except Exception:
+			key = ("video", url)
+
+		return await self._resolve(key, lambda: VideoInfo(url, pytube.YouTube(url)), self.video_ttl)
+
+
+	async def search(self, term, limit=1):
+		key = ("search", " ".join(term.lower().split()), limit)
+
+		return await self._resolve(key, lambda: youtubesearchpython.VideosSearch(term, limit=limit).result()["result"], self.search_ttl)
+
+
+	# url of the best opus audio stream, which can be remuxed straight to discord without decoding.
+	# youtube's stream urls expire after a few hours, so they're kept no longer than the video metadata
+	async def opus_stream_url(self, url):
+		def resolve():
+			stream = pytube.YouTube(url).streams.filter(only_audio=True, audio_codec="opus").order_by("abr").last()
+			return stream.url if stream else None
+
+		try:
+			key = ("opus_stream", pytube.extract.video_id(url))
+		except Exception:
+			key = ("opus_stream", url)
+
+		return await self._resolve(key, resolve, self.video_ttl)
+
+
+	async def playlist(self, url, limit=None):
+		try:
+			key = ("playlist", pytube.extract.playlist_id(url))
+		except Exception:
+			key = ("playlist", url)
+
+		urls = await self._resolve(key, lambda: list(pytube.Playlist(url).video_urls), self.search_ttl)
+		return urls[:limit]
+
+
+	def close(self):
+		self._executor.shutdown(wait=False)